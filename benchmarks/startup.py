@@ -0,0 +1,75 @@
+#! /usr/bin/env python
+"""Measures interpreter startup + import time for dichot entry points
+
+Each statement is timed in a fresh python process so that module caching
+doesn't hide the import cost. Usage:
+
+    python benchmarks/startup.py [-n repeats]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+STATEMENTS = [
+    ("baseline interpreter", "pass"),
+    ("import dichot", "import dichot"),
+    ("dichot.prnt.status", "from dichot import prnt; prnt.status"),
+    ("dichot.read (numpy only)", "import dichot; dichot.read.bands"),
+    ("dichot.read + gdal", "import dichot; dichot.read._gdal.VersionInfo"),
+    ("dichot.read + pandas", "import dichot; dichot.read._pd.DataFrame"),
+    ("dichot.model (sklearn)", "import dichot; dichot.model()"),
+]
+
+
+def time_statement(statement, repeats):
+    """Times a python statement in fresh interpreters
+
+    Args:
+        statement - the python code to run
+        repeats   - the number of processes to launch
+
+    Returns:
+        a sorted list of wall-clock times in seconds
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join([ROOT, env.get("PYTHONPATH", "")])
+
+    times = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", statement],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        times.append(time.perf_counter() - start)
+
+    return sorted(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "-n", "--repeats", help="processes per statement", default=10, type=int
+    )
+    argv = parser.parse_args()
+
+    print("{:<32} {:>10} {:>10}".format("statement", "median ms", "min ms"))
+    for label, statement in STATEMENTS:
+        try:
+            times = time_statement(statement, argv.repeats)
+        except subprocess.CalledProcessError:
+            print("{:<32} {:>21}".format(label, "failed"))
+            continue
+
+        median = times[len(times) // 2] * 1000
+        print("{:<32} {:>10.1f} {:>10.1f}".format(label, median, times[0] * 1000))
+
+
+if __name__ == "__main__":
+    main()
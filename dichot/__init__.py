@@ -1,8 +1,44 @@
-from . import crown_ensemble
-from . import outliers
-from . import read
-from . import resample
-from . import transform
-from . import write
-from ._core import *
+import importlib as _importlib
+
 from ._version import __version__
+
+# submodules and core functions are imported on first use to keep startup fast
+_submodules = [
+    "cache",
+    "compress",
+    "cross_validation",
+    "crown_ensemble",
+    "feature_selection",
+    "outliers",
+    "pipeline",
+    "plan",
+    "read",
+    "resample",
+    "serve",
+    "transform",
+    "write",
+]
+_core_names = [
+    "match_species_ids",
+    "encode_labels",
+    "get_class_weights",
+    "get_sample_weights",
+    "model",
+    "cascade",
+]
+
+__all__ = _submodules + _core_names
+
+
+def __getattr__(name):
+    if name in _submodules:
+        return _importlib.import_module("." + name, __name__)
+
+    if name in _core_names:
+        return getattr(_importlib.import_module("._core", __name__), name)
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
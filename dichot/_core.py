@@ -1,10 +1,13 @@
 import copy as _copy
 import os as _os
+import time as _time
 
 import numpy as _np
-from sklearn import calibration as _calibration
-from sklearn import ensemble as _ensemble
-from sklearn import utils as _utils
+
+from . import _lazy
+
+_calibration = _lazy.module("sklearn.calibration")
+_ensemble = _lazy.module("sklearn.ensemble")
 
 _path = _os.path.realpath(__file__)
 
@@ -41,29 +44,65 @@ def match_species_ids(crown_id, label_id, labels):
     return [unique_labels, unique_crowns, crown_labels]
 
 
-def get_sample_weights(y):
-    """Calculates the balanced sample weights for a set of unique classes
+def encode_labels(y):
+    """Encodes class labels as integer codes, counting the samples per class in the same pass
 
     Args:
         y - the input class labels
 
     Returns:
-        weights_sample - an array of length (y) with the per-class weights per sample
+        list of [classes, codes, counts]
+        classes - the sorted unique class labels
+        codes   - an integer array of length (y) with the index into classes of each sample
+        counts  - the number of samples of each class
+    """
+    classes, codes, counts = _np.unique(y, return_inverse=True, return_counts=True)
+
+    return [classes, codes.ravel(), counts]
+
+
+def get_class_weights(counts, method="balanced", classes=None):
+    """Calculates per-class weights from the number of samples per class
+
+    Args:
+        counts  - the number of samples of each class (see encode_labels())
+        method  - 'balanced' weights classes by n_samples / (n_classes * count),
+                  'inverse_sqrt' by 1 / sqrt(count), scaled so the mean sample weight is 1.
+                  a dictionary of {class: weight} sets weights directly (missing classes get 1)
+        classes - the class labels for each count. required if method is a dictionary
+
+    Returns:
+        weights_class - an array with the weight of each class
     """
-    # get the unique classes in the array
-    classes = _np.unique(y)
-    n_classes = len(classes)
+    counts = _np.asarray(counts, dtype=_np.float64)
+
+    if isinstance(method, dict):
+        return _np.array([method.get(c, 1.0) for c in classes], dtype=_np.float64)
+
+    elif method == "balanced":
+        return counts.sum() / (len(counts) * counts)
+
+    elif method == "inverse_sqrt":
+        return counts.sum() / (_np.sqrt(counts).sum() * _np.sqrt(counts))
 
-    # calculate the per-class weights
-    weights_class = _utils.class_weight.compute_class_weight("balanced", classes, y)
+    else:
+        raise ValueError("Unsupported class weight method: {}".format(method))
 
-    # create and return an array the same dimensions as the input y vector
-    weights_sample = _np.zeros(len(y))
-    for i in range(n_classes):
-        ind_y = y == classes[i]
-        weights_sample[ind_y] = weights_class[i]
 
-    return weights_sample
+def get_sample_weights(y, method="balanced"):
+    """Calculates the balanced sample weights for a set of unique classes
+
+    Args:
+        y      - the input class labels
+        method - the class weighting method (see get_class_weights())
+
+    Returns:
+        weights_sample - an array of length (y) with the per-class weights per sample
+    """
+    classes, codes, counts = encode_labels(y)
+    weights_class = get_class_weights(counts, method=method, classes=classes)
+
+    return weights_class[codes]
 
 
 # -----
@@ -157,6 +196,9 @@ class model:
             self.reducer = reducer
 
         self.n_features_ = None
+        self.selected_features_ = None
+        self.crown_percentiles_ = None
+        self.member_order_ = None
         self.is_calibrated_ = False
 
     def fit(self, x, y, sample_weight=None):
@@ -181,7 +223,7 @@ class model:
                 labels.append("SP-{}".format(unique))
             self.labels_ = labels
 
-    def calibrate(self, x, y, run_calibration=None):
+    def calibrate(self, x, y, run_calibration=None, prefit=False):
         """Calibrates the probabilities for each classification model
 
         Args:
@@ -189,20 +231,92 @@ class model:
             y               - the probability calibration labels
             run_calibration - a boolean array with length n_models specifying
                               True for each model to calibrate
+            prefit          - flag to calibrate the already-fit models on held-out data
+                              (cv='prefit') instead of refitting them in cross validation
 
         Returns:
             None. Updates each item in self.calibrated_models_
         """
+        calibrator = self.calibrator
+        if prefit:
+            calibrator = _copy.copy(self.calibrator)
+            calibrator.set_params(cv="prefit")
+
         for i in range(self.n_models_):
             # if self.run_calibration_[i] or run_calibration[i]:
-            self.calibrator.set_params(base_estimator=self.models_[i])
-            self.calibrator.fit(x, y)
-            self.calibrated_models_[i] = _copy.copy(self.calibrator)
+            calibrator.set_params(base_estimator=self.models_[i])
+            calibrator.fit(x, y)
+            self.calibrated_models_[i] = _copy.copy(calibrator)
             # else:
             #    self.calibrated_models_[i] = _copy.copy(self.models_[i])
 
         self.is_calibrated_ = True
 
+    def update(self, x, y, n_new=None, sample_weight=None):
+        """Adds trees or boosting stages fit to new data to each classification model
+
+        The existing trees are kept and only the new ones are fit (via warm_start), so
+        updates are much faster than retraining. Warm-started models can't add or drop
+        classes, so the new data must include every class the models were fit with.
+        The calibrated models are cleared, so re-run calibrate() afterwards
+        (e.g., with prefit=True on held-out new data).
+
+        Args:
+            x             - the new training features, already transformed (see transform())
+            y             - the new training labels
+            n_new         - the number of trees or stages to add to each model. defaults
+                            to a quarter of each model's current number
+            sample_weight - the per-sample training weights
+
+        Returns:
+            None. Updates each item in self.models_
+        """
+        # check every model can be updated before changing any of them
+        y_unique = _np.unique(y)
+        for member in self.models_:
+            name = type(member).__name__
+            if "warm_start" not in member.get_params() or not hasattr(
+                member, "estimators_"
+            ):
+                raise ValueError(
+                    "Unable to update {}: not a fitted, warm-startable ensemble".format(
+                        name
+                    )
+                )
+
+            added = _np.setdiff1d(y_unique, member.classes_)
+            if len(added) > 0:
+                raise ValueError(
+                    "Unable to update {}: new classes {} require retraining".format(
+                        name, ", ".join(added.astype(str))
+                    )
+                )
+
+            missing = _np.setdiff1d(member.classes_, y_unique)
+            if len(missing) > 0:
+                raise ValueError(
+                    "Unable to update {}: no samples for classes {}. Include archived samples for these classes".format(
+                        name, ", ".join(missing.astype(str))
+                    )
+                )
+
+        for member in self.models_:
+            n_trees = len(member.estimators_)
+            if n_new is None:
+                n_add = max(1, n_trees // 4)
+            else:
+                n_add = n_new
+
+            member.set_params(warm_start=True, n_estimators=n_trees + n_add)
+            try:
+                member.fit(x, y, sample_weight=sample_weight)
+            finally:
+                member.set_params(warm_start=False)
+
+        # the calibrated models wrap the old fits
+        self.calibrated_models_ = _np.repeat(None, self.n_models_)
+        self.is_calibrated_ = False
+
     def tune(self, x, y, param_grids, criterion):
         pass
 
@@ -259,6 +373,114 @@ class model:
         else:
             return output
 
+    def order_by_cost(self, x, use_calibrated=False):
+        """Times each model on sample data and stores the order from cheapest to most expensive
+
+        Args:
+            x              - a sample of input features to time predictions with
+            use_calibrated - boolean for whether to time the calibrated models
+
+        Returns:
+            None. Updates self.member_order_
+        """
+        times = []
+        for i in range(self.n_models_):
+            if use_calibrated:
+                member = self.calibrated_models_[i]
+            else:
+                member = self.models_[i]
+
+            start = _time.perf_counter()
+            member.predict_proba(x)
+            times.append(_time.perf_counter() - start)
+
+        self.member_order_ = _np.argsort(times)
+
+    def predict_proba_early_exit(self, x, margin=0.5, use_calibrated=False):
+        """Predict the averaged class probabilities, skipping the remaining models for
+        samples the models evaluated so far already agree on
+
+        Models are evaluated in the order set by order_by_cost() (cheapest first). After
+        each model, samples whose running average probability has a gap of at least
+        margin between the top two classes are finalized.
+
+        Args:
+            x              - the input features
+            margin         - the top-two probability gap required to stop early
+            use_calibrated - boolean for whether to use the calibrated models
+
+        Returns:
+            list of [output, n_exited]
+            output         - the probabilities averaged over the models evaluated per sample
+            n_exited       - the number of samples finalized after each model
+        """
+        # models saved before early exit was added won't have this attribute
+        order = getattr(self, "member_order_", None)
+        if order is None:
+            order = range(self.n_models_)
+
+        n_samples = x.shape[0]
+        output = None
+        total = None
+        active = _np.arange(n_samples)
+        n_exited = _np.zeros(self.n_models_, dtype=int)
+
+        for stage, i in enumerate(order):
+            if use_calibrated:
+                predicted = self.calibrated_models_[i].predict_proba(x[active])
+            else:
+                predicted = self.models_[i].predict_proba(x[active])
+
+            if total is None:
+                output = _np.zeros((n_samples, predicted.shape[1]))
+                total = _np.zeros((n_samples, predicted.shape[1]))
+            total[active] += predicted
+            running = total[active] / (stage + 1)
+
+            # the last model finalizes everything still active
+            if stage == self.n_models_ - 1 or predicted.shape[1] < 2:
+                output[active] = running
+                n_exited[stage] = len(active)
+                break
+
+            top = _np.partition(running, -2, axis=1)
+            confident = (top[:, -1] - top[:, -2]) >= margin
+            output[active[confident]] = running[confident]
+            n_exited[stage] = confident.sum()
+
+            active = active[~confident]
+            if len(active) == 0:
+                break
+
+        return [output, n_exited]
+
+    def transform(self, x, subset=True):
+        """Applies the good band subset and data reducer stored in the model to raw features
+
+        Args:
+            x      - the input features with shape (n_samples, n_bands)
+            subset - flag to apply the good band subset. set to False if x
+                     only contains the good bands
+
+        Returns:
+            an array of transformed features with shape (n_samples, n_features)
+        """
+        if subset and self.good_bands_ is not None:
+            x = x[:, self.good_bands_]
+
+        if self.reducer is not None:
+            x = self.reducer.transform(x)
+
+            if self.n_features_ is not None:
+                x = x[:, 0 : self.n_features_]
+
+        # models saved before feature selection was added won't have this attribute
+        selected = getattr(self, "selected_features_", None)
+        if selected is not None:
+            x = x[:, selected]
+
+        return x
+
     def set_params(self, params):
         """Sets the parameters for each model
 
@@ -270,3 +492,210 @@ class model:
         """
         for i in range(self.n_models_):
             self.models_[i].set_params(**params[i])
+
+
+class cascade:
+    def __init__(
+        self,
+        genus_map,
+        genus_model=None,
+        species_model=None,
+        min_proba=0.02,
+        average_proba=True,
+        labels=None,
+        good_bands=None,
+        reducer=None,
+    ):
+        """Creates a hierarchical classifier that predicts genus first, then species within
+        each genus. Pixels only run the species models for genera they could plausibly
+        belong to, so well-separated genera skip most of the species-level work.
+
+        Args:
+            genus_map     - a dictionary mapping each species class label to its genus
+            genus_model   - the sklearn classifier used to predict genus
+                            (defaults to a small random forest)
+            species_model - a dichot model object used as the template for each genus's
+                            species model (defaults to dichot.model())
+            min_proba     - the minimum genus probability for a pixel to run that genus's
+                            species model. below this, the genus probability is split
+                            across its species by their training frequency
+            average_proba - flag to report probabilities without the trailing model axis
+            labels        - the species labels for each class
+            good_bands    - a boolean array of good band values to store (but not used by this object)
+            reducer       - the data reducer/transformer to apply to input data
+
+        Returns:
+            a cascade model object with the same prediction interface as dichot.model
+        """
+        self.genus_map_ = genus_map
+
+        if genus_model is None:
+            self.genus_model_ = _ensemble.RandomForestClassifier(n_estimators=50)
+        else:
+            self.genus_model_ = genus_model
+
+        if species_model is None:
+            self.species_model_ = model()
+        else:
+            self.species_model_ = species_model
+
+        self.min_proba_ = min_proba
+        self.average_proba_ = average_proba
+        self.labels_ = labels
+        self.good_bands_ = good_bands
+        self.reducer = reducer
+        self.n_features_ = None
+        self.selected_features_ = None
+        self.crown_percentiles_ = None
+        self.is_calibrated_ = False
+
+        # the cascade produces a single set of probabilities per pixel
+        self.n_models_ = 1
+
+        # set by fit()
+        self.classes_ = None
+        self.genera_ = None
+        self.submodels_ = None
+        self.columns_ = None
+        self.priors_ = None
+        self.skipped_ = None
+
+    def _genus(self, y):
+        classes, codes, counts = encode_labels(y)
+        genus = _np.array([self.genus_map_[c] for c in classes])
+        return genus[codes]
+
+    def fit(self, x, y, sample_weight=None):
+        """Fits the genus model and a species model for each genus
+
+        Args:
+            x             - the training features
+            y             - the training species labels
+            sample_weight - the per-sample training weights
+
+        Returns:
+            None. Updates self.genus_model_ and self.submodels_
+        """
+        genus = self._genus(y)
+        self.classes_ = _np.unique(y)
+        self.genera_ = _np.unique(genus)
+        self.genus_model_.fit(x, genus, sample_weight=sample_weight)
+
+        self.submodels_ = []
+        self.columns_ = []
+        self.priors_ = []
+        for g in self.genera_:
+            index = genus == g
+            species, counts = _np.unique(y[index], return_counts=True)
+            self.columns_.append(_np.searchsorted(self.classes_, species))
+            self.priors_.append(counts / counts.sum())
+
+            # genera with a single species don't need a species model
+            if len(species) == 1:
+                self.submodels_.append(None)
+            else:
+                submodel = _copy.deepcopy(self.species_model_)
+                weights = None if sample_weight is None else sample_weight[index]
+                submodel.fit(x[index], y[index], sample_weight=weights)
+                self.submodels_.append(submodel)
+
+        if self.labels_ is None:
+            self.labels_ = ["SP-{}".format(c) for c in self.classes_]
+
+    def calibrate(self, x, y, run_calibration=None):
+        """Calibrates the probabilities for each species model on its genus's samples
+
+        Args:
+            x               - the probability calibration features
+            y               - the probability calibration species labels
+            run_calibration - unused. kept for compatibility with dichot.model
+
+        Returns:
+            None. Updates the calibrated models in self.submodels_
+        """
+        genus = self._genus(y)
+        for g, submodel in zip(self.genera_, self.submodels_):
+            if submodel is not None:
+                index = genus == g
+                submodel.calibrate(x[index], y[index])
+
+        self.is_calibrated_ = True
+
+    def predict_proba(self, x, use_calibrated=False, average_proba=None):
+        """Predict the probabilities for each species as P(genus) * P(species | genus)
+
+        Args:
+            x              - the input features
+            use_calibrated - boolean for whether to use the calibrated species models
+            average_proba  - if False, the output has a trailing model axis of length 1,
+                             matching the un-averaged output of dichot.model. defaults
+                             to self.average_proba_
+
+        Returns:
+            an array of species probabilities with shape (n_samples, n_classes)
+        """
+        genus_proba = self.genus_model_.predict_proba(x)
+        output = _np.zeros((x.shape[0], len(self.classes_)))
+
+        n_run, n_possible = 0, 0
+        for j in range(len(self.genera_)):
+            columns = self.columns_[j]
+            submodel = self.submodels_[j]
+            pg = genus_proba[:, j]
+
+            if submodel is None:
+                output[:, columns[0]] = pg
+                continue
+
+            # pixels unlikely to be this genus split its probability by species frequency
+            run = pg >= self.min_proba_
+            skip = ~run
+            output[_np.ix_(skip, columns)] = pg[skip, None] * self.priors_[j]
+
+            if run.any():
+                ps = submodel.predict_proba(
+                    x[run], use_calibrated=use_calibrated, average_proba=True
+                )
+                output[_np.ix_(run, columns)] = pg[run, None] * ps
+
+            n_run += run.sum()
+            n_possible += len(run)
+
+        # the fraction of species-model evaluations skipped
+        self.skipped_ = 1 - n_run / n_possible if n_possible > 0 else 0.0
+
+        if average_proba is None:
+            average_proba = self.average_proba_
+
+        if average_proba:
+            return output
+        else:
+            return _np.expand_dims(output, 2)
+
+    def predict(self, x, use_calibrated=False):
+        """Predict the class labels for given feature data
+
+        Args:
+            x              - the input features
+            use_calibrated - boolean for whether to use the calibrated species models
+
+        Returns:
+            output         - an array with shape (n_samples, 1) with the predicted class labels
+        """
+        proba = self.predict_proba(
+            x, use_calibrated=use_calibrated, average_proba=True
+        )
+        return _np.expand_dims(self.classes_[proba.argmax(axis=1)], 1)
+
+    def transform(self, x, subset=True):
+        """Applies the good band subset and data reducer stored in the model to raw features
+
+        Args:
+            x      - the input features with shape (n_samples, n_bands)
+            subset - flag to apply the good band subset. set to False if x
+                     only contains the good bands
+
+        Returns:
+            an array of transformed features with shape (n_samples, n_features)
+        """
+        return model.transform(self, x, subset=subset)
@@ -0,0 +1,41 @@
+"""Deferred imports for heavy third-party dependencies
+"""
+import importlib as _importlib
+
+
+class module:
+    def __init__(self, name, on_import=None):
+        """Creates a stand-in for a module that is only imported on first attribute access,
+        so that `import dichot` and `dc-apply -h` don't pay for gdal, sklearn or pandas.
+
+        Args:
+            name      - the full module name to import (e.g., 'osgeo.gdal')
+            on_import - an optional function called once with the imported module
+                        (e.g., to set module-level configuration)
+
+        Returns:
+            an object that forwards attribute access to the imported module
+        """
+        self._name = name
+        self._on_import = on_import
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            loaded = _importlib.import_module(self._name)
+            if self._on_import is not None:
+                self._on_import(loaded)
+            self._module = loaded
+
+        return self._module
+
+    def __getattr__(self, attr):
+        # only called for attributes not set in __init__, i.e. the module contents
+        if attr in ("_name", "_on_import", "_module"):
+            raise AttributeError(attr)
+
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        status = "loaded" if self._module is not None else "not loaded"
+        return "<lazy module '{}' ({})>".format(self._name, status)
@@ -217,6 +217,124 @@ def feature_selection(parser):
     return parser
 
 
+def selection_method(parser):
+    parser.add_argument(
+        "--selection-method",
+        help="the method for ranking features during feature selection",
+        choices=["importance", "mutual_info"],
+        default="importance",
+    )
+    return parser
+
+
+def selection_tolerance(parser):
+    parser.add_argument(
+        "--selection-tolerance",
+        help="the maximum cross-validated accuracy loss allowed by feature selection",
+        default=0.01,
+        type=float,
+    )
+    return parser
+
+
+def update(parser):
+    parser.add_argument(
+        "--update",
+        help="path to an existing ccbid model to update with new training data, reusing its reducer",
+        default=None,
+        type=str,
+    )
+    return parser
+
+
+def update_trees(parser):
+    parser.add_argument(
+        "--update-trees",
+        help="the number of trees/boosting stages to add to each model when updating. defaults to a quarter of each model's size",
+        default=None,
+        type=int,
+    )
+    return parser
+
+
+def resample(parser):
+    parser.add_argument(
+        "--resample",
+        help="the number of samples per class to draw while streaming the training data",
+        default=None,
+        type=int,
+    )
+    return parser
+
+
+def without_replacement(parser):
+    parser.add_argument(
+        "--without-replacement",
+        help="resample each class without replacement",
+        action="store_true",
+    )
+    return parser
+
+
+def crown_cap(parser):
+    parser.add_argument(
+        "--crown-cap",
+        help="the maximum number of resampled samples per crown",
+        default=None,
+        type=int,
+    )
+    return parser
+
+
+def crown_features(parser):
+    parser.add_argument(
+        "--crown-features",
+        help="train on per-crown summary features (mean, std and percentiles) instead of pixels",
+        action="store_true",
+    )
+    return parser
+
+
+def percentiles(parser):
+    parser.add_argument(
+        "--percentiles",
+        help="the percentiles of each feature to summarize per crown",
+        nargs="+",
+        default=[10, 50, 90],
+        type=float,
+    )
+    return parser
+
+
+def class_weight(parser):
+    parser.add_argument(
+        "--class-weight",
+        help="the method for weighting training samples by class frequency",
+        default="balanced",
+        choices=["balanced", "inverse_sqrt"],
+    )
+    return parser
+
+
+def cascade(parser):
+    parser.add_argument(
+        "--cascade",
+        help="flag to train a genus-then-species cascade model",
+        action="store_true",
+    )
+    return parser
+
+
+def early_exit(parser):
+    parser.add_argument(
+        "--early-exit",
+        help="the top-two probability margin for skipping the remaining ensemble models",
+        default=None,
+        type=float,
+    )
+    return parser
+
+
 def cpus(parser):
     parser.add_argument(
         "--cpus",
@@ -234,3 +352,193 @@ def verbose(parser):
         help="turn on verbose mode. Not that I have that much to say..",
         action="store_true",
     )
+
+
+# arguments for the prediction server
+def host(parser):
+    parser.add_argument(
+        "--host",
+        help="the address for the prediction server to listen on",
+        default="127.0.0.1",
+        type=str,
+    )
+    return parser
+
+
+def port(parser):
+    parser.add_argument(
+        "-p",
+        "--port",
+        help="the port for the prediction server to listen on",
+        default=8765,
+        type=int,
+    )
+    return parser
+
+
+def max_batch(parser):
+    parser.add_argument(
+        "--max-batch",
+        help="the maximum number of samples to predict in a single batch",
+        default=65536,
+        type=int,
+    )
+    return parser
+
+
+def max_wait(parser):
+    parser.add_argument(
+        "--max-wait",
+        help="milliseconds to wait for concurrent requests to join a batch",
+        default=2.0,
+        type=float,
+    )
+    return parser
+
+
+def transformed(parser):
+    parser.add_argument(
+        "--transformed",
+        help="flag to indicate input features are already band-subset and transformed",
+        action="store_true",
+    )
+    return parser
+
+
+def tile_size(parser):
+    parser.add_argument(
+        "--tile-size",
+        help="the width and height in pixels of the tiles used to process rasters",
+        default=512,
+        type=int,
+    )
+    return parser
+
+
+def scale(parser):
+    parser.add_argument(
+        "--scale",
+        help="the factor converting stored raster values to model units (e.g., 0.0001), or 'auto' to read it from the raster band metadata",
+        default=None,
+        type=str,
+    )
+    return parser
+
+
+def offset(parser):
+    parser.add_argument(
+        "--offset",
+        help="the offset added to raster values after scaling",
+        default=None,
+        type=float,
+    )
+    return parser
+
+
+def fused(parser):
+    parser.add_argument(
+        "--fused",
+        help="keep raster tiles in their stored data type (e.g., int16) and apply the scale and reducer in a single step",
+        action="store_true",
+    )
+    return parser
+
+
+def dedup(parser):
+    parser.add_argument(
+        "--dedup",
+        help="predict each distinct pixel spectrum in a raster tile only once",
+        action="store_true",
+    )
+    return parser
+
+
+def dedup_cache(parser):
+    parser.add_argument(
+        "--dedup-cache",
+        help="the number of recently predicted spectra to remember across tiles (implies --dedup)",
+        default=0,
+        type=int,
+    )
+    return parser
+
+
+def max_memory(parser):
+    parser.add_argument(
+        "--max-memory",
+        help="the memory budget in GB. sets the tile size and number of workers used to process rasters",
+        default=None,
+        type=float,
+    )
+    return parser
+
+
+def cache_dir(parser):
+    parser.add_argument(
+        "--cache-dir",
+        help="directory to cache preprocessed features in, shared across model runs",
+        default=None,
+        type=str,
+    )
+    return parser
+
+
+def cache_size(parser):
+    parser.add_argument(
+        "--cache-size",
+        help="the maximum size of the feature cache in GB",
+        default=20.0,
+        type=float,
+    )
+    return parser
+
+
+def gdal_cache(parser):
+    parser.add_argument(
+        "--gdal-cache",
+        help="the size of the gdal raster block cache in MB",
+        default=None,
+        type=int,
+    )
+    return parser
+
+
+def gdal_threads(parser):
+    parser.add_argument(
+        "--gdal-threads",
+        help="the number of threads gdal may use to (de)compress raster blocks, or ALL_CPUS",
+        default=None,
+        type=str,
+    )
+    return parser
+
+
+def cv_folds(parser):
+    parser.add_argument(
+        "--cv-folds",
+        help="the number of crown-grouped folds for cross validation (0 to skip)",
+        default=0,
+        type=int,
+    )
+    return parser
+
+
+# arguments for model compression
+def speedup(parser):
+    parser.add_argument(
+        "--speedup",
+        help="the target prediction speedup for the compressed model",
+        default=2.0,
+        type=float,
+    )
+    return parser
+
+
+def tolerance(parser):
+    parser.add_argument(
+        "--tolerance",
+        help="the maximum increase in held-out log loss allowed by compression",
+        default=0.05,
+        type=float,
+    )
+    return parser
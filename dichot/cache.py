@@ -0,0 +1,261 @@
+"""An on-disk cache of preprocessed feature data shared across model runs
+
+Entries are keyed by the content of the input file and the preprocessing settings
+(good bands, reducer, number of features), so models that share a reducer can
+skip reading and transforming the same scene twice. Arrays are stored in numpy
+.npy format and read back as memory maps. The least recently used entries are
+evicted once the cache grows past its size cap.
+"""
+import hashlib as _hashlib
+import os as _os
+import pickle as _pickle
+import shutil as _shutil
+
+import numpy as _np
+from numpy.lib import format as _format
+
+
+def file_hash(path, chunk_size=2**24):
+    """Calculates the sha1 hash of a file's contents
+
+    Args:
+        path       - the path to the file
+        chunk_size - the number of bytes to read at a time
+
+    Returns:
+        the hex digest of the file contents
+    """
+    sha = _hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def fingerprint(obj):
+    """Calculates a hash identifying a python object (e.g., a fitted reducer)
+
+    Args:
+        obj - the object to fingerprint. arrays are hashed by value,
+              other objects by their pickled state
+
+    Returns:
+        the hex digest of the object
+    """
+    if obj is None:
+        return "none"
+
+    if isinstance(obj, _np.ndarray):
+        data = _np.ascontiguousarray(obj)
+        payload = str((data.dtype.str, data.shape)).encode() + data.tobytes()
+    else:
+        payload = _pickle.dumps(obj, protocol=4)
+
+    return _hashlib.sha1(payload).hexdigest()
+
+
+def key(input_file, good_bands=None, reducer=None, n_features=None, extra=None):
+    """Builds the cache key for a set of preprocessed features
+
+    Args:
+        input_file - the path to the input feature data (csv or raster)
+        good_bands - the boolean good band mask applied to the data
+        reducer    - the data reducer applied to the data
+        n_features - the number of transformed features kept
+        extra      - any other settings that change the output (e.g., outlier thresholds)
+
+    Returns:
+        a hex string identifying the preprocessed features
+    """
+    parts = [
+        file_hash(input_file),
+        fingerprint(good_bands),
+        fingerprint(reducer),
+        str(n_features),
+        repr(extra),
+    ]
+
+    return _hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+
+class store:
+    def __init__(self, path, max_size=None):
+        """Creates or opens an on-disk cache of feature arrays
+
+        Args:
+            path     - the cache directory
+            max_size - the maximum size of the cache in bytes. if None, nothing is evicted
+
+        Returns:
+            a cache object to get and put arrays by key
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        _os.makedirs(path, exist_ok=True)
+
+    def _entry(self, key):
+        return _os.path.join(self.path, key)
+
+    def get(self, key):
+        """Reads the arrays stored under a key
+
+        Args:
+            key - the cache key (see cache.key())
+
+        Returns:
+            a dictionary of read-only memory-mapped arrays, or None if the key isn't cached
+        """
+        entry = self._entry(key)
+        if not _os.path.isdir(entry):
+            self.misses += 1
+            return None
+
+        arrays = {}
+        for name in _os.listdir(entry):
+            if name.endswith(".npy"):
+                arrays[name[:-4]] = _np.load(
+                    _os.path.join(entry, name), mmap_mode="r", allow_pickle=False
+                )
+
+        # mark the entry as recently used
+        _os.utime(entry)
+        self.hits += 1
+
+        return arrays
+
+    def create(self, key, shapes):
+        """Allocates writable memory-mapped arrays for a new entry, to be filled in place
+
+        Args:
+            key    - the cache key
+            shapes - a dictionary of {name: (shape, dtype)} for each array to allocate
+
+        Returns:
+            a dictionary of writable memory-mapped arrays. call commit(key) once they're filled
+        """
+        staging = "{}.tmp-{}".format(self._entry(key), _os.getpid())
+        _os.makedirs(staging, exist_ok=True)
+
+        arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            arrays[name] = _format.open_memmap(
+                _os.path.join(staging, name + ".npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=shape,
+            )
+
+        return arrays
+
+    def commit(self, key, arrays=None):
+        """Publishes an entry allocated with create() and evicts old entries if needed
+
+        Args:
+            key    - the cache key
+            arrays - the dictionary returned by create(), flushed before publishing
+
+        Returns:
+            None
+        """
+        if arrays is not None:
+            for array in arrays.values():
+                array.flush()
+
+        staging = "{}.tmp-{}".format(self._entry(key), _os.getpid())
+        try:
+            _os.rename(staging, self._entry(key))
+        except OSError:
+            # another run published the same entry first
+            _shutil.rmtree(staging, ignore_errors=True)
+
+        # the staging directory's mtime is from create(). mark the entry as just used
+        #  so it isn't the first one evicted
+        try:
+            _os.utime(self._entry(key))
+        except OSError:
+            pass
+
+        self.evict()
+
+    def discard(self, key):
+        """Removes a partially written entry allocated with create()
+
+        Args:
+            key - the cache key
+
+        Returns:
+            None
+        """
+        staging = "{}.tmp-{}".format(self._entry(key), _os.getpid())
+        _shutil.rmtree(staging, ignore_errors=True)
+
+    def put(self, key, **arrays):
+        """Stores arrays under a key
+
+        Args:
+            key    - the cache key
+            arrays - the named arrays to store (e.g., features=x, ids=crown_id)
+
+        Returns:
+            None
+        """
+        shapes = {name: (array.shape, array.dtype) for name, array in arrays.items()}
+        staged = self.create(key, shapes)
+        for name, array in arrays.items():
+            staged[name][...] = array
+
+        self.commit(key, staged)
+
+    def entries(self):
+        """Lists the cached entries from least to most recently used
+
+        Args:
+            None
+
+        Returns:
+            a list of [key, last_used, n_bytes] for each entry
+        """
+        entries = []
+        for key in _os.listdir(self.path):
+            entry = self._entry(key)
+            if ".tmp-" in key or not _os.path.isdir(entry):
+                continue
+
+            n_bytes = 0
+            for name in _os.listdir(entry):
+                n_bytes += _os.path.getsize(_os.path.join(entry, name))
+            entries.append([key, _os.path.getmtime(entry), n_bytes])
+
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def size(self):
+        """Returns the total size of the cached entries in bytes"""
+        return sum([entry[2] for entry in self.entries()])
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is under max_size
+
+        Args:
+            None
+
+        Returns:
+            the number of entries removed
+        """
+        if self.max_size is None:
+            return 0
+
+        entries = self.entries()
+        total = sum([entry[2] for entry in entries])
+        n_removed = 0
+
+        # keep the most recent entry even if it alone exceeds the cap
+        while total > self.max_size and len(entries) > 1:
+            key, last_used, n_bytes = entries.pop(0)
+            _shutil.rmtree(self._entry(key), ignore_errors=True)
+            total -= n_bytes
+            n_removed += 1
+
+        return n_removed
@@ -0,0 +1,290 @@
+"""Methods for compressing fitted tree ensembles to speed up prediction
+
+Inference cost in the tree ensembles scales with the number of trees (random
+forests) or boosting stages (gradient boosting). These functions truncate each
+ensemble member, or drop members entirely, and choose the smallest configuration
+whose held-out log loss stays within a user tolerance.
+"""
+import copy as _copy
+import itertools as _itertools
+import time as _time
+
+import numpy as _np
+
+from . import _lazy
+
+_metrics = _lazy.module("sklearn.metrics")
+
+# the fractions of each member's trees to consider keeping
+fractions = [1.0, 0.75, 0.5, 0.35, 0.25, 0.15, 0.1, 0.05]
+
+
+def n_trees(estimator):
+    """Returns the number of trees or boosting stages in a fitted ensemble
+
+    Args:
+        estimator - a fitted sklearn random forest, extra trees or gradient boosting classifier
+
+    Returns:
+        the number of trees (forests) or stages (boosting)
+    """
+    return len(estimator.estimators_)
+
+
+def truncate(estimator, n):
+    """Creates a copy of a fitted tree ensemble that only uses its first n trees/stages
+
+    Args:
+        estimator - a fitted sklearn tree ensemble classifier
+        n         - the number of trees or boosting stages to keep
+
+    Returns:
+        a truncated copy of the estimator
+    """
+    if not hasattr(estimator, "estimators_"):
+        raise ValueError(
+            "Unable to truncate {}: not a tree ensemble".format(
+                type(estimator).__name__
+            )
+        )
+
+    n = max(1, min(n, n_trees(estimator)))
+
+    # copy everything but the trees, then keep references to the trees that are used
+    trees = estimator.estimators_
+    estimator.estimators_ = None
+    try:
+        truncated = _copy.deepcopy(estimator)
+    finally:
+        estimator.estimators_ = trees
+
+    truncated.estimators_ = trees[:n]
+    truncated.n_estimators = n
+    if hasattr(truncated, "n_estimators_"):
+        truncated.n_estimators_ = n
+    if getattr(truncated, "train_score_", None) is not None:
+        truncated.train_score_ = truncated.train_score_[:n]
+    if getattr(truncated, "oob_improvement_", None) is not None:
+        truncated.oob_improvement_ = truncated.oob_improvement_[:n]
+
+    return truncated
+
+
+def _calibrated_estimators(calibrated):
+    # the fitted base estimators inside a CalibratedClassifierCV, for each sklearn version
+    for inner in calibrated.calibrated_classifiers_:
+        if hasattr(inner, "estimator"):
+            yield inner, "estimator"
+        else:
+            yield inner, "base_estimator"
+
+
+def truncate_calibrated(calibrated, fraction):
+    """Truncates every fitted ensemble inside a calibrated classifier
+
+    Args:
+        calibrated - a fitted sklearn CalibratedClassifierCV object
+        fraction   - the fraction of trees or stages to keep
+
+    Returns:
+        a copy of the calibrated classifier with truncated base estimators
+    """
+    inners = list(_calibrated_estimators(calibrated))
+    originals = [getattr(inner, attr) for inner, attr in inners]
+
+    # share the original fitted estimators between copies rather than deep copying them
+    for inner, attr in inners:
+        setattr(inner, attr, None)
+    try:
+        truncated = _copy.deepcopy(calibrated)
+    finally:
+        for (inner, attr), original in zip(inners, originals):
+            setattr(inner, attr, original)
+
+    for (inner, attr), original in zip(_calibrated_estimators(truncated), originals):
+        setattr(
+            inner, attr, truncate(original, int(round(fraction * n_trees(original))))
+        )
+
+    return truncated
+
+
+def encode(model, labels):
+    """Converts class labels to column indices of the model's probability outputs
+
+    Args:
+        model  - a fitted dichot model object
+        labels - the class labels (e.g., species ids matched with match_species_ids())
+
+    Returns:
+        an integer array with the probability column of each label
+    """
+    _check_ensemble(model)
+    classes = model.models_[0].classes_
+
+    # models trained on resampled data use integer codes in the order of model.labels_
+    if classes.dtype.kind in "iu":
+        lookup = _np.asarray(model.labels_).astype(str)
+    else:
+        lookup = _np.asarray(classes).astype(str)
+
+    labels = _np.asarray(labels).astype(str)
+    order = _np.argsort(lookup)
+    position = _np.searchsorted(lookup, labels, sorter=order)
+    found = position < len(lookup)
+    idx = order[_np.minimum(position, len(lookup) - 1)]
+    found &= lookup[idx] == labels
+    if not found.all():
+        raise ValueError(
+            "Labels not in the model's classes: {}".format(
+                ", ".join(_np.unique(labels[~found]))
+            )
+        )
+
+    return idx
+
+
+def _check_ensemble(model):
+    if not hasattr(model, "models_"):
+        raise ValueError(
+            "Unable to compress {}: not an ensemble model".format(type(model).__name__)
+        )
+
+
+def _time_predict(estimator, x, repeats=3):
+    times = []
+    for i in range(repeats):
+        start = _time.perf_counter()
+        estimator.predict_proba(x)
+        times.append(_time.perf_counter() - start)
+
+    return min(times)
+
+
+def _member(model, i, use_calibrated):
+    if use_calibrated:
+        return model.calibrated_models_[i]
+    else:
+        return model.models_[i]
+
+
+def _shrink(estimator, fraction, use_calibrated):
+    if use_calibrated:
+        return truncate_calibrated(estimator, fraction)
+    else:
+        return truncate(estimator, int(round(fraction * n_trees(estimator))))
+
+
+def ensemble(model, x, y, speedup=2.0, tolerance=0.05, use_calibrated=True):
+    """Compresses a fitted dichot model to hit a target speedup within a log loss tolerance
+
+    Each member's held-out probabilities are computed once per candidate size, so all
+    combinations of member sizes (including dropping a member) can be scored cheaply.
+    Member costs are measured by timing predictions on the held-out data.
+
+    Args:
+        model          - a fitted dichot model object
+        x              - held-out features, already transformed (see model.transform())
+        y              - held-out labels as probability column indices (see compress.encode())
+        speedup        - the target ratio of original to compressed prediction time
+        tolerance      - the maximum increase in held-out log loss allowed
+        use_calibrated - flag to compress and score the calibrated models
+
+    Returns:
+        list of [compressed, report]
+        compressed     - a new, smaller dichot model object
+        report         - a dictionary with the baseline and selected log loss, accuracy,
+                         tree counts and estimated/measured speedups, plus the list of
+                         candidate configurations that were scored
+    """
+    _check_ensemble(model)
+    use_calibrated = use_calibrated and model.is_calibrated_
+    n_classes = len(model.labels_)
+    labels = _np.arange(n_classes)
+
+    # score each member at each size, and time each member at full size
+    probs, costs = [], []
+    for i in range(model.n_models_):
+        member = _member(model, i, use_calibrated)
+        costs.append(_time_predict(member, x))
+        member_probs = {}
+        for fraction in fractions:
+            shrunk = (
+                member
+                if fraction == 1.0
+                else _shrink(member, fraction, use_calibrated)
+            )
+            member_probs[fraction] = shrunk.predict_proba(x)
+        probs.append(member_probs)
+    full_cost = sum(costs)
+
+    # score every combination of member sizes, where a fraction of 0 drops the member
+    candidates = []
+    for config in _itertools.product([0.0] + fractions, repeat=model.n_models_):
+        if max(config) == 0:
+            continue
+        kept = [i for i in range(model.n_models_) if config[i] > 0]
+        prob = _np.mean([probs[i][config[i]] for i in kept], axis=0)
+        cost = sum([costs[i] * config[i] for i in kept])
+        candidates.append(
+            {
+                "fractions": config,
+                "log_loss": _metrics.log_loss(y, prob, labels=labels),
+                "accuracy": _metrics.accuracy_score(y, prob.argmax(axis=1)),
+                "speedup": full_cost / cost,
+            }
+        )
+
+    baseline = [c for c in candidates if min(c["fractions"]) == 1.0][0]
+    allowed = [
+        c for c in candidates if c["log_loss"] <= baseline["log_loss"] + tolerance
+    ]
+    fast_enough = [c for c in allowed if c["speedup"] >= speedup]
+
+    # prefer the most accurate configuration that hits the target, otherwise the fastest
+    if fast_enough:
+        selected = min(fast_enough, key=lambda c: c["log_loss"])
+    else:
+        selected = max(allowed, key=lambda c: c["speedup"])
+
+    # build the compressed model
+    compressed = _copy.copy(model)
+    kept = [i for i in range(model.n_models_) if selected["fractions"][i] > 0]
+    compressed.models_ = []
+    compressed.calibrated_models_ = _np.repeat(None, len(kept))
+    for j, i in enumerate(kept):
+        fraction = selected["fractions"][i]
+        compressed.models_.append(_shrink(model.models_[i], fraction, False))
+        if model.is_calibrated_:
+            compressed.calibrated_models_[j] = truncate_calibrated(
+                model.calibrated_models_[i], fraction
+            )
+    compressed.n_models_ = len(kept)
+
+    # keep the early exit order of the remaining members, re-indexed to the new list
+    order = getattr(model, "member_order_", None)
+    if order is not None:
+        order = _np.array([kept.index(i) for i in order if i in kept])
+    compressed.member_order_ = order
+
+    # measure the actual speedup on the held-out data
+    timings = []
+    for m in [model, compressed]:
+        times = []
+        for i in range(3):
+            start = _time.perf_counter()
+            m.predict_proba(x, use_calibrated=use_calibrated, average_proba=True)
+            times.append(_time.perf_counter() - start)
+        timings.append(min(times))
+
+    report = {
+        "baseline": baseline,
+        "selected": selected,
+        "trees_before": [n_trees(m) for m in model.models_],
+        "trees_after": [n_trees(m) for m in compressed.models_],
+        "members_kept": kept,
+        "measured_speedup": timings[0] / timings[1],
+        "candidates": candidates,
+    }
+
+    return [compressed, report]
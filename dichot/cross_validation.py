@@ -0,0 +1,199 @@
+"""Crown-grouped k-fold cross validation with the feature data held in shared memory
+
+The feature matrix and labels are copied into shared memory once, sorted by fold
+and stored twice end to end, so each fold's test data and training data are both
+contiguous slices. Worker processes attach to the shared block instead of
+receiving a pickled copy of the data with each task, and fit on views of it.
+"""
+import copy as _copy
+import multiprocessing as _multiprocessing
+from multiprocessing import shared_memory as _shared_memory
+
+import numpy as _np
+
+from ._core import encode_labels as _encode_labels
+from ._core import get_sample_weights as _get_sample_weights
+from . import feature_selection as _feature_selection
+
+# the arrays attached to in each worker process
+_shared = {}
+
+
+def crown_folds(crown_id, labels, n_splits=5, seed=None):
+    """Assigns each crown to a fold, stratified by class, so no crown spans two folds
+
+    Args:
+        crown_id - an array of per-sample crown IDs
+        labels   - an array of per-sample class labels
+        n_splits - the number of folds
+        seed     - the random seed for shuffling crowns
+
+    Returns:
+        folds    - an integer array with the fold index (0 to n_splits-1) for each sample
+    """
+    rng = _np.random.default_rng(seed)
+    crowns, crown_index, crown_counts = _encode_labels(crown_id)
+
+    # find the label of each crown from its first sample
+    first = _np.zeros(len(crowns), dtype=int)
+    first[crown_index[::-1]] = _np.arange(len(crown_index))[::-1]
+    crown_labels = _np.asarray(labels)[first]
+
+    # deal the crowns of each class out to the folds like cards, continuing the
+    #  rotation between classes so small classes don't all land in the first fold
+    crown_fold = _np.zeros(len(crowns), dtype=int)
+    offset = 0
+    for label in _np.unique(crown_labels):
+        index = _np.where(crown_labels == label)[0]
+        rng.shuffle(index)
+        crown_fold[index] = (_np.arange(len(index)) + offset) % n_splits
+        offset += len(index)
+
+    return crown_fold[crown_index]
+
+
+def _share(array):
+    shm = _shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = _np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)
+    view[...] = array
+
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(specs):
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = _shared_memory.SharedMemory(name=shm_name)
+        _shared[name] = (shm, _np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _run_fold(task):
+    model, start, stop, n_classes, calibrate, class_weight, selection = task
+    x = _shared["x"][1]
+    y = _shared["y"][1]
+
+    # the samples are stored twice end to end, so the rows after the test fold and
+    #  the wrapped-around rows before it form one contiguous training view
+    n_samples = len(x) // 2
+    xtest, ytest = x[start:stop], y[start:stop]
+    xtrain, ytrain = x[stop : n_samples + start], y[stop : n_samples + start]
+
+    # select features on the training fold only, so the score includes selection
+    if selection is not None:
+        selected, report = _feature_selection.select(xtrain, ytrain, **selection)
+        xtrain, xtest = xtrain[:, selected], xtest[:, selected]
+
+    model.fit(
+        xtrain, ytrain, sample_weight=_get_sample_weights(ytrain, method=class_weight)
+    )
+    if calibrate:
+        model.calibrate(xtrain, ytrain)
+
+    prob = model.predict_proba(xtest, use_calibrated=calibrate, average_proba=True)
+
+    # expand to all classes in case a class was missing from this training fold
+    yprob = _np.zeros((len(ytest), n_classes))
+    if getattr(model, "classes_", None) is not None:
+        classes = model.classes_
+    else:
+        classes = model.models_[0].classes_
+    yprob[:, classes.astype(int)] = prob
+
+    return ytest.copy(), yprob
+
+
+def run(
+    model,
+    features,
+    labels,
+    crown_id,
+    n_splits=5,
+    n_jobs=1,
+    calibrate=False,
+    seed=None,
+    class_weight="balanced",
+    selection=None,
+):
+    """Runs crown-grouped k-fold cross validation in parallel processes
+
+    Args:
+        model        - an unfitted dichot model object, copied for each fold
+        features     - the feature data with shape (n_samples, n_features)
+        labels       - the class labels for each sample
+        crown_id     - the crown ID of each sample. all samples from a crown share a fold
+        n_splits     - the number of folds
+        n_jobs       - the number of worker processes
+        calibrate    - flag to calibrate each fold's model and report calibrated probabilities
+        seed         - the random seed for assigning crowns to folds
+        class_weight - the class weighting method for fitting (see get_class_weights())
+        selection    - optional keyword arguments for feature_selection.select(). features
+                       are then selected within each training fold
+
+    Returns:
+        list of [classes, results]
+        classes      - the unique class labels, in the order of the probability columns
+        results      - a list with one [ytrue, ypred, yprob] entry per fold, where ytrue and
+                       ypred are indices into classes and yprob has shape (n_test, n_classes)
+    """
+    classes, codes, counts = _encode_labels(labels)
+    codes = codes.astype(_np.int32)
+    folds = crown_folds(crown_id, codes, n_splits=n_splits, seed=seed)
+
+    # sort the samples by fold so each test fold is a contiguous block
+    order = _np.argsort(folds, kind="stable")
+    bounds = _np.searchsorted(folds[order], _np.arange(n_splits + 1))
+
+    # store the sorted samples twice so every training fold is a contiguous slice
+    order = _np.concatenate((order, order))
+    shm_x, spec_x = _share(_np.ascontiguousarray(_np.asarray(features)[order]))
+    shm_y, spec_y = _share(codes[order])
+    specs = {"x": spec_x, "y": spec_y}
+
+    # folds are fit on class codes, so a cascade's genus map needs the same keys
+    if getattr(model, "genus_map_", None) is not None:
+        model = _copy.copy(model)
+        model.genus_map_ = {
+            i: model.genus_map_[label] for i, label in enumerate(classes)
+        }
+
+    # folds already run in parallel, so each fold's selection uses one core
+    if selection is not None and n_jobs > 1:
+        selection = dict(selection, n_jobs=1)
+
+    tasks = [
+        (
+            _copy.deepcopy(model),
+            bounds[i],
+            bounds[i + 1],
+            len(classes),
+            calibrate,
+            class_weight,
+            selection,
+        )
+        for i in range(n_splits)
+        if bounds[i + 1] > bounds[i]
+    ]
+
+    try:
+        if n_jobs > 1:
+            with _multiprocessing.Pool(
+                processes=min(n_jobs, len(tasks)),
+                initializer=_attach,
+                initargs=(specs,),
+            ) as pool:
+                outputs = pool.map(_run_fold, tasks)
+        else:
+            _attach(specs)
+            outputs = [_run_fold(task) for task in tasks]
+            for name in list(_shared):
+                shm, view = _shared.pop(name)
+                del view
+                shm.close()
+
+    finally:
+        for shm in [shm_x, shm_y]:
+            shm.close()
+            shm.unlink()
+
+    results = [[ytrue, yprob.argmax(axis=1), yprob] for ytrue, yprob in outputs]
+
+    return [classes, results]
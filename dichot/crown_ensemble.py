@@ -50,3 +50,58 @@ def get_csv_labels(id_labels, sp_labels):
     sp_rows = _np.repeat(sp_unique, n_id).reshape(n_sp, n_id).flatten(order="F")
 
     return id_rows, sp_rows
+
+
+# a function to summarize pixel features by crown id
+def summarize(features, id_labels, percentiles=(10, 50, 90)):
+    """Calculates per-crown summary features (mean, standard deviation and percentiles)
+
+    Args:
+        features    - the pixel feature data with shape (n_samples, n_features)
+        id_labels   - the labels (usually, crown labels) that features are summarized to
+        percentiles - the percentiles (0-100) of each feature to calculate per crown
+
+    Returns:
+        list of [id_unique, summary]
+        id_unique   - the unique id labels, one per summary row
+        summary     - the summary features with shape (n_ids, n_features * (2 + n_percentiles)),
+                      ordered as the means, then the standard deviations, then each percentile
+                      of all features
+    """
+    features = _np.asarray(features, dtype=_np.float64)
+    id_unique, group, counts = _np.unique(
+        id_labels, return_inverse=True, return_counts=True
+    )
+    group = group.ravel()
+
+    # sort the samples by group so each crown is a contiguous block
+    order = _np.argsort(group, kind="stable")
+    x = features[order]
+    starts = _np.concatenate(([0], _np.cumsum(counts)[:-1]))
+
+    # grouped means and standard deviations
+    n = counts[:, _np.newaxis]
+    mean = _np.add.reduceat(x, starts, axis=0) / n
+    residual = x - _np.repeat(mean, counts, axis=0)
+    std = _np.sqrt(_np.add.reduceat(residual**2, starts, axis=0) / n)
+
+    # sort each feature within each group at once by offsetting values by group index,
+    #  with values scaled to [0, 0.5] so groups can't overlap
+    low = x.min(axis=0)
+    span = x.max(axis=0) - low
+    span[span == 0] = 1
+    keys = (x - low) / span * 0.5 + group[order][:, _np.newaxis]
+    x = _np.take_along_axis(x, _np.argsort(keys, axis=0), axis=0)
+
+    # linearly interpolate each percentile between the bracketing sorted values
+    blocks = [mean, std]
+    for percentile in percentiles:
+        position = percentile / 100 * (counts - 1)
+        lower = _np.floor(position).astype(int)
+        upper = _np.ceil(position).astype(int)
+        fraction = (position - lower)[:, _np.newaxis]
+        blocks.append(
+            x[starts + lower] * (1 - fraction) + x[starts + upper] * fraction
+        )
+
+    return [id_unique, _np.concatenate(blocks, axis=1)]
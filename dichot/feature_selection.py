@@ -0,0 +1,176 @@
+"""Methods for selecting a compact subset of spectral features for classification
+"""
+import copy as _copy
+
+import numpy as _np
+
+from . import _lazy
+
+_base = _lazy.module("sklearn.base")
+_decomposition = _lazy.module("sklearn.decomposition")
+_ensemble = _lazy.module("sklearn.ensemble")
+_feature_selection = _lazy.module("sklearn.feature_selection")
+_model_selection = _lazy.module("sklearn.model_selection")
+
+
+def rank(features, labels, method="importance", n_jobs=1, seed=None):
+    """Ranks features by how much they contribute to separating classes
+
+    Args:
+        features - the feature data with shape (n_samples, n_features)
+        labels   - the class labels for each sample
+        method   - the ranking method. 'importance' uses random forest impurity
+                   importance, 'mutual_info' uses the mutual information with the labels
+        n_jobs   - the number of cores to use
+        seed     - the random seed
+
+    Returns:
+        list of [order, scores]
+        order    - the feature indices sorted from most to least important
+        scores   - the importance score for each feature
+    """
+    if method == "importance":
+        forest = _ensemble.RandomForestClassifier(
+            n_estimators=200, n_jobs=n_jobs, random_state=seed
+        )
+        forest.fit(features, labels)
+        scores = forest.feature_importances_
+
+    elif method == "mutual_info":
+        scores = _feature_selection.mutual_info_classif(
+            features, labels, random_state=seed
+        )
+
+    else:
+        raise ValueError("Unsupported ranking method: {}".format(method))
+
+    order = _np.argsort(scores, kind="stable")[::-1]
+
+    return [order, scores]
+
+
+def select(
+    features,
+    labels,
+    estimator=None,
+    method="importance",
+    tolerance=0.01,
+    candidates=None,
+    cv=3,
+    n_jobs=1,
+    seed=None,
+):
+    """Finds the smallest set of top-ranked features that stays within an accuracy tolerance
+
+    Args:
+        features   - the feature data with shape (n_samples, n_features)
+        labels     - the class labels for each sample
+        estimator  - the sklearn classifier used to score each subset
+                     (defaults to a random forest)
+        method     - the ranking method (see feature_selection.rank())
+        tolerance  - the maximum drop in cross-validated accuracy allowed relative to
+                     using all features (e.g., 0.01 for one percentage point)
+        candidates - a list of subset sizes to test. defaults to halving the number
+                     of features down to one
+        cv         - the number of cross validation folds
+        n_jobs     - the number of cores to use
+        seed       - the random seed
+
+    Returns:
+        list of [selected, report]
+        selected   - the sorted indices of the selected features
+        report     - a list of [n_features, accuracy] for each subset size tested
+    """
+    n_features = features.shape[1]
+    if estimator is None:
+        estimator = _ensemble.RandomForestClassifier(
+            n_estimators=100, n_jobs=n_jobs, random_state=seed
+        )
+
+    order, scores = rank(features, labels, method=method, n_jobs=n_jobs, seed=seed)
+
+    if candidates is None:
+        candidates = []
+        k = n_features
+        while k >= 1:
+            candidates.append(k)
+            k //= 2
+    candidates = sorted(set([min(k, n_features) for k in candidates] + [n_features]))
+
+    def score(k):
+        subset = features[:, _np.sort(order[:k])]
+        return _model_selection.cross_val_score(
+            _base.clone(estimator), subset, labels, cv=cv
+        ).mean()
+
+    # score the full feature set first, then search up from the smallest subset
+    baseline = score(n_features)
+    report = [[n_features, float(baseline)]]
+    selected_k = n_features
+    for k in candidates[:-1]:
+        accuracy = score(k)
+        report.append([k, float(accuracy)])
+        if accuracy >= baseline - tolerance:
+            selected_k = k
+            break
+
+    return [_np.sort(order[:selected_k]), sorted(report)]
+
+
+def _is_projection(reducer):
+    # reducers whose outputs are each a dot product with one row of components_, so
+    #  dropping rows drops exactly those outputs. NMF, FastICA etc. don't qualify
+    if reducer is None:
+        return False
+
+    return isinstance(
+        reducer,
+        (
+            _decomposition.PCA,
+            _decomposition.IncrementalPCA,
+            _decomposition.TruncatedSVD,
+        ),
+    )
+
+
+def apply(model, selected):
+    """Stores a feature selection in a model so it's applied at prediction time
+
+    Where possible, the selection is folded into the model's preprocessing so the
+    unused work is skipped entirely: with no reducer, the good band mask is narrowed
+    so fewer bands are read, and with a PCA, IncrementalPCA or TruncatedSVD reducer,
+    the unused components are dropped so the projection is cheaper.
+
+    Args:
+        model    - a dichot model object
+        selected - the sorted indices of the selected features, relative to the
+                   output of model.transform()
+
+    Returns:
+        None. Updates the model's good_bands_, reducer, n_features_ or selected_features_
+    """
+    selected = _np.asarray(selected)
+
+    if model.reducer is None and model.good_bands_ is not None:
+        bands = _np.where(model.good_bands_)[0][selected]
+        good_bands = _np.zeros_like(model.good_bands_)
+        good_bands[bands] = True
+        model.good_bands_ = good_bands
+
+    elif _is_projection(model.reducer):
+        reducer = _copy.deepcopy(model.reducer)
+        reducer.components_ = reducer.components_[selected]
+        for attr in [
+            "explained_variance_",
+            "explained_variance_ratio_",
+            "singular_values_",
+        ]:
+            if getattr(reducer, attr, None) is not None:
+                setattr(reducer, attr, getattr(reducer, attr)[selected])
+        reducer.n_components_ = len(selected)
+        reducer.n_components = len(selected)
+        model.reducer = reducer
+        model.n_features_ = len(selected)
+
+    else:
+        model.selected_features_ = selected
@@ -1,7 +1,9 @@
 """Methods for outlier identification in refl data
 """
 import numpy as _np
-from sklearn.decomposition import PCA as _PCA
+from . import _lazy
+
+_decomposition = _lazy.module("sklearn.decomposition")
 
 
 def with_pca(features, n_pcs=20, thresh=3):
@@ -21,7 +23,7 @@ def with_pca(features, n_pcs=20, thresh=3):
     mask = _np.repeat(True, features.shape[0])
 
     # set up the pca reducer, then transform the data
-    reducer = _PCA(n_components=n_pcs, whiten=True)
+    reducer = _decomposition.PCA(n_components=n_pcs, whiten=True)
     transformed = reducer.fit_transform(features)
 
     # loop through the number of pcs set and flag values outside the threshold
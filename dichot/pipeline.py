@@ -0,0 +1,656 @@
+"""A tiled, multi-threaded pipeline for applying models to raster data
+
+Raster apply runs as three stages connected by bounded queues: a reader thread
+that fills recycled tile buffers from disk, a pool of compute threads that
+transform and classify each tile, and a writer thread that writes probability
+tiles to the output file. Reading and writing overlap with prediction, and the
+bounded queues keep the number of tiles in memory fixed.
+"""
+import collections as _collections
+import queue as _queue
+import threading as _threading
+import time as _time
+
+import numpy as _np
+
+from . import prnt as _prnt
+from . import read as _read
+from . import transform as _transform
+
+# the value written to pixels that were masked or had no data
+no_data = -9999
+
+
+def tiles(nx, ny, xsize, ysize):
+    """Splits a raster into rectangular windows
+
+    Args:
+        nx    - the number of raster columns
+        ny    - the number of raster rows
+        xsize - the number of columns per tile
+        ysize - the number of rows per tile
+
+    Returns:
+        a generator of (xoff, yoff, xsize, ysize) tuples covering the raster
+    """
+    for yoff in range(0, ny, ysize):
+        for xoff in range(0, nx, xsize):
+            yield xoff, yoff, min(xsize, nx - xoff), min(ysize, ny - yoff)
+
+
+class metrics:
+    def __init__(self):
+        """Tracks stage timing and queue depths to find the pipeline bottleneck
+
+        Args:
+            None
+
+        Returns:
+            an object with per-stage and per-queue counters, updated by the pipeline
+        """
+        self._lock = _threading.Lock()
+        self.stages = {}
+        self.queues = {}
+        self.counts = {}
+
+    def add_time(self, stage, kind, seconds):
+        """Accumulates time spent by a stage
+
+        Args:
+            stage   - the stage name (e.g., 'read')
+            kind    - one of 'busy', 'wait_in' (starved for input) or 'wait_out' (blocked on output)
+            seconds - the time to add
+
+        Returns:
+            None
+        """
+        with self._lock:
+            times = self.stages.setdefault(
+                stage, {"busy": 0.0, "wait_in": 0.0, "wait_out": 0.0, "tiles": 0}
+            )
+            times[kind] += seconds
+
+    def add_tile(self, stage):
+        with self._lock:
+            self.stages[stage]["tiles"] += 1
+
+    def add_count(self, name, n):
+        """Accumulates a named counter (e.g., the number of pixels exiting early)
+
+        Args:
+            name - the counter name
+            n    - the amount to add
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def sample(self, name, q):
+        """Records the current depth of a queue
+
+        Args:
+            name - the queue name
+            q    - the queue.Queue object
+
+        Returns:
+            None
+        """
+        depth = q.qsize()
+        with self._lock:
+            counts = self.queues.setdefault(
+                name, {"sum": 0, "n": 0, "max": 0, "size": q.maxsize}
+            )
+            counts["sum"] += depth
+            counts["n"] += 1
+            counts["max"] = max(counts["max"], depth)
+
+    def bottleneck(self, n_threads):
+        """Finds the stage with the most busy time per thread
+
+        Args:
+            n_threads - a dictionary with the number of threads per stage
+
+        Returns:
+            the name of the slowest stage
+        """
+        busy = {
+            stage: times["busy"] / n_threads.get(stage, 1)
+            for stage, times in self.stages.items()
+        }
+        return max(busy, key=busy.get)
+
+    def report(self, n_threads):
+        """Prints stage timing and queue depths
+
+        Args:
+            n_threads - a dictionary with the number of threads per stage
+
+        Returns:
+            None
+        """
+        for stage, times in self.stages.items():
+            _prnt.status(
+                "{:>8}: {} tiles, {:.2f}s busy, {:.2f}s waiting for input, {:.2f}s blocked on output".format(
+                    stage,
+                    times["tiles"],
+                    times["busy"],
+                    times["wait_in"],
+                    times["wait_out"],
+                )
+            )
+
+        for name, counts in self.queues.items():
+            _prnt.status(
+                "{:>8} queue: mean depth {:.1f}, max depth {} of {}".format(
+                    name,
+                    counts["sum"] / max(counts["n"], 1),
+                    counts["max"],
+                    counts["size"],
+                )
+            )
+
+        for name, count in self.counts.items():
+            _prnt.status("{:>8}: {}".format(name, count))
+
+        if self.stages:
+            _prnt.status("Bottleneck stage: {}".format(self.bottleneck(n_threads)))
+
+
+def unique_rows(x):
+    """Finds the unique rows (e.g., pixel spectra) of a 2d array by their bytes
+
+    Args:
+        x - the input array with shape (n_samples, n_features)
+
+    Returns:
+        list of [index, inverse, keys]
+        index   - the index of the first occurrence of each unique row
+        inverse - the index into the unique rows of each row of x
+        keys    - the bytes of each unique row as a numpy void array, for use as cache keys
+    """
+    x = _np.ascontiguousarray(x)
+    rows = x.view(_np.dtype((_np.void, x.dtype.itemsize * x.shape[1]))).ravel()
+    keys, index, inverse = _np.unique(rows, return_index=True, return_inverse=True)
+
+    return [index, inverse.ravel(), keys]
+
+
+class memo:
+    def __init__(self, max_size=100000, n_shards=16):
+        """A thread-safe, least recently used cache of per-spectrum probabilities
+
+        Keys are spread over shards, each with its own lock and its share of max_size,
+        so compute threads looking up different spectra rarely wait on each other.
+
+        Args:
+            max_size - the maximum number of spectra to remember
+            n_shards - the number of independently locked shards
+
+        Returns:
+            an object to get and put probabilities keyed by spectrum bytes
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        # split max_size across the shards so the total never exceeds it
+        n_shards = max(1, min(n_shards, max_size))
+        self._shard_sizes = [
+            max_size // n_shards + (i < max_size % n_shards) for i in range(n_shards)
+        ]
+        self._shards = [_collections.OrderedDict() for i in range(n_shards)]
+        self._locks = [_threading.Lock() for i in range(n_shards)]
+        self._count_lock = _threading.Lock()
+
+    def __len__(self):
+        return sum([len(shard) for shard in self._shards])
+
+    def _group(self, keys):
+        # the positions of the keys that belong to each shard
+        groups = {}
+        n_shards = len(self._shards)
+        for i, key in enumerate(keys):
+            groups.setdefault(hash(key) % n_shards, []).append(i)
+
+        return groups
+
+    def get(self, keys):
+        """Looks up the probabilities of a list of spectra
+
+        Args:
+            keys - a list of spectrum keys (see unique_rows())
+
+        Returns:
+            list of [found, values]
+            found  - a boolean array flagging the keys that were cached
+            values - a list with the cached probabilities of each key, or None
+        """
+        found = _np.zeros(len(keys), dtype=bool)
+        values = [None] * len(keys)
+        for shard, positions in self._group(keys).items():
+            cache = self._shards[shard]
+            with self._locks[shard]:
+                for i in positions:
+                    value = cache.get(keys[i])
+                    if value is not None:
+                        cache.move_to_end(keys[i])
+                        found[i] = True
+                        values[i] = value
+
+        n_found = int(found.sum())
+        with self._count_lock:
+            self.hits += n_found
+            self.misses += len(keys) - n_found
+
+        return [found, values]
+
+    def put(self, keys, values):
+        """Stores the probabilities of a list of spectra, evicting the least recently used
+
+        Args:
+            keys   - a list of spectrum keys
+            values - an array of probabilities with one row per key
+
+        Returns:
+            None
+        """
+        for shard, positions in self._group(keys).items():
+            cache = self._shards[shard]
+            with self._locks[shard]:
+                for i in positions:
+                    cache[keys[i]] = values[i].copy()
+                    cache.move_to_end(keys[i])
+                while len(cache) > self._shard_sizes[shard]:
+                    cache.popitem(last=False)
+
+
+class _stopped(Exception):
+    pass
+
+
+class _runner:
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.stop = _threading.Event()
+        self.errors = []
+
+    def get(self, q, stage, kind="wait_in"):
+        start = _time.perf_counter()
+        while True:
+            try:
+                item = q.get(timeout=0.1)
+                break
+            except _queue.Empty:
+                if self.stop.is_set():
+                    raise _stopped()
+        self.metrics.add_time(stage, kind, _time.perf_counter() - start)
+        return item
+
+    def put(self, q, item, stage, name):
+        start = _time.perf_counter()
+        while True:
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except _queue.Full:
+                if self.stop.is_set():
+                    raise _stopped()
+        self.metrics.add_time(stage, "wait_out", _time.perf_counter() - start)
+        self.metrics.sample(name, q)
+
+    def thread(self, target, *args):
+        def run():
+            try:
+                target(*args)
+            except _stopped:
+                pass
+            except Exception as error:
+                self.errors.append(error)
+                self.stop.set()
+
+        thread = _threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+def apply_raster(
+    model,
+    input_file,
+    output_file,
+    tile_size=512,
+    n_workers=1,
+    n_buffers=None,
+    mask_file=None,
+    use_calibrated=None,
+    driver="GTiff",
+    options=None,
+    cache=None,
+    cache_key=None,
+    early_exit=None,
+    scale=None,
+    offset=None,
+    fused=False,
+    dedup=False,
+    dedup_cache=0,
+    verbose=False,
+):
+    """Applies a model to a raster tile by tile, writing per-class probabilities
+
+    Args:
+        model          - a fitted dichot model object
+        input_file     - the path to the input reflectance raster
+        output_file    - the path to the output probability raster (one band per class)
+        tile_size      - the tile width/height in pixels
+        n_workers      - the number of compute threads
+        n_buffers      - the number of input tile buffers to cycle through. defaults to
+                         two per worker so reads are double-buffered
+        mask_file      - an optional binary raster. only pixels equal to 1 are classified
+        use_calibrated - boolean for whether to use the calibrated models. defaults to
+                         using them if the model has been calibrated
+        driver         - the gdal driver for the output file
+        options        - gdal creation options for the output file
+        cache          - an optional cache.store object. transformed features are read from
+                         the cache if available, and written to it otherwise
+        cache_key      - the key identifying this input's transformed features (see cache.key())
+        early_exit     - if set, the top-two probability margin for finalizing pixels before
+                         all models are evaluated (see model.predict_proba_early_exit())
+        scale          - the factor converting stored raster values to model units, one value
+                         or one per good band. 'auto' reads it from the band metadata
+        offset         - the offset added after scaling, one value or one per good band
+        fused          - flag to keep tiles in the raster's data type (e.g., int16) and apply
+                         the scale, offset and reducer as a single float32 affine step
+        dedup          - flag to predict each distinct pixel spectrum in a tile only once
+        dedup_cache    - the number of recently scored spectra to remember across tiles.
+                         0 disables the cache. implies dedup
+        verbose        - flag to print stage timing and queue depth metrics
+
+    Returns:
+        a pipeline.metrics object with the stage timing and queue depths
+    """
+    if early_exit is not None and not hasattr(model, "predict_proba_early_exit"):
+        raise ValueError(
+            "Early exit is not supported for {} models".format(type(model).__name__)
+        )
+
+    if use_calibrated is None:
+        use_calibrated = model.is_calibrated_
+
+    raster = _read.raster(input_file)
+    n_classes = len(model.labels_)
+
+    # only read the bands the model uses
+    if model.good_bands_ is not None:
+        band_list = [int(b) + 1 for b in _np.where(model.good_bands_)[0]]
+    else:
+        band_list = list(range(1, raster.nb + 1))
+    n_bands = len(band_list)
+
+    # the factors converting stored values to model units
+    if isinstance(scale, str) and scale == "auto":
+        scale, offset = raster.scaling(band_list)
+    scaled = scale is not None or offset is not None
+    if scale is None:
+        scale = 1.0
+    if offset is None:
+        offset = 0.0
+
+    # fold the scaling into the reducer, if it's linear
+    affine = None
+    if fused:
+        affine = _transform.linear(model, scale=scale, offset=offset)
+        if affine is None and verbose:
+            _prnt.status("Unable to fuse a non-linear reducer. Scaling separately")
+
+    # remember the probabilities of recently scored spectra across tiles
+    recent = None
+    if dedup_cache > 0:
+        dedup = True
+        recent = memo(dedup_cache)
+
+    # check for cached transformed features, stored as [y, x, features] with nan for
+    #  pixels that were masked or had no data
+    cached, staged = None, None
+    if cache is not None:
+        entry = cache.get(cache_key)
+        if entry is not None:
+            cached = entry["features"]
+            n_bands = cached.shape[2]
+            dtype = cached.dtype
+        else:
+            n_transformed = model.transform(
+                _np.zeros((1, n_bands)), subset=False
+            ).shape[1]
+            staged = cache.create(
+                cache_key,
+                {"features": ((raster.ny, raster.nx, n_transformed), _np.float32)},
+            )
+
+    # create the output file
+    output = raster.copy(
+        output_file,
+        nb=n_classes,
+        driver=driver,
+        dt=_read.gdal_dtype(_np.float32),
+        options=options,
+    )
+    output.no_data = no_data
+    output.write_metadata()
+
+    # the recycled input buffers. each holds the largest possible tile, flattened
+    #  so edge tiles can be viewed as contiguous arrays
+    if n_buffers is None:
+        n_buffers = 2 * n_workers
+    if cached is None:
+        dtype = _read.numpy_dtype(raster.dt)
+    free = _queue.Queue()
+    for i in range(n_buffers):
+        free.put(_np.empty(n_bands * tile_size * tile_size, dtype=dtype))
+
+    read_queue = _queue.Queue(maxsize=n_buffers)
+    write_queue = _queue.Queue(maxsize=2 * n_workers)
+
+    stats = metrics()
+    runner = _runner(stats)
+
+    def cache_reader():
+        for xoff, yoff, xs, ys in tiles(raster.nx, raster.ny, tile_size, tile_size):
+            buf = runner.get(free, "read", kind="wait_out")
+            start = _time.perf_counter()
+            data = buf[: n_bands * ys * xs].reshape(ys * xs, n_bands)
+            data[...] = cached[yoff : yoff + ys, xoff : xoff + xs].reshape(-1, n_bands)
+            valid = ~_np.isnan(data[:, 0])
+            stats.add_time("read", "busy", _time.perf_counter() - start)
+            stats.add_tile("read")
+            runner.put(
+                read_queue, ((xoff, yoff, xs, ys), buf, data, valid), "read", "read"
+            )
+
+        for i in range(n_workers):
+            runner.put(read_queue, None, "read", "read")
+
+    def reader():
+        mask = None
+        if mask_file is not None:
+            mask = _read.raster(mask_file)
+
+        for xoff, yoff, xs, ys in tiles(raster.nx, raster.ny, tile_size, tile_size):
+            # waiting on a free buffer means the downstream stages are behind
+            buf = runner.get(free, "read", kind="wait_out")
+            start = _time.perf_counter()
+            data = buf[: n_bands * ys * xs].reshape(n_bands, ys, xs)
+            raster.read_window(xoff, yoff, xs, ys, bands=band_list, out=data)
+            valid = None
+            if mask is not None:
+                valid = mask.read_window(xoff, yoff, xs, ys, bands=[1]).ravel() == 1
+            stats.add_time("read", "busy", _time.perf_counter() - start)
+            stats.add_tile("read")
+            runner.put(
+                read_queue, ((xoff, yoff, xs, ys), buf, data, valid), "read", "read"
+            )
+
+        for i in range(n_workers):
+            runner.put(read_queue, None, "read", "read")
+
+        if mask is not None:
+            mask.close()
+
+    def transform(x):
+        # converts valid pixels from stored values to model features
+        if affine is not None:
+            return _transform.affine(x, *affine)
+
+        if scaled:
+            x = x * scale + offset
+        return model.transform(x, subset=False)
+
+    def predict(x):
+        if early_exit is not None:
+            predicted, n_exited = model.predict_proba_early_exit(
+                x, margin=early_exit, use_calibrated=use_calibrated
+            )
+            for stage, n in enumerate(n_exited):
+                stats.add_count("exited after {} model(s)".format(stage + 1), int(n))
+            return predicted
+
+        return model.predict_proba(
+            x, use_calibrated=use_calibrated, average_proba=True
+        )
+
+    def compute():
+        while True:
+            item = runner.get(read_queue, "compute")
+            if item is None:
+                runner.put(write_queue, None, "compute", "write")
+                return
+
+            window, buf, data, valid = item
+            start = _time.perf_counter()
+            xoff, yoff, xs, ys = window
+
+            if cached is not None:
+                # cached tiles are already transformed
+                x = data[valid]
+                free.put(buf)
+                transformed = True
+
+            else:
+                # reshape from [bands, y, x] to [pixels, bands] and flag no-data pixels
+                features = data.reshape(n_bands, ys * xs).T
+                if valid is None:
+                    valid = _np.repeat(True, ys * xs)
+                if raster.no_data is not None:
+                    valid &= ~(features == raster.no_data).any(axis=1)
+
+                # copying the valid pixels frees the input buffer for the next read
+                x = features[valid]
+                free.put(buf)
+                transformed = False
+
+            prob = _np.full((n_classes, ys * xs), no_data, dtype=_np.float32)
+            if x.shape[0] > 0:
+                # score each distinct spectrum once
+                inverse = None
+                if dedup:
+                    index, inverse, keys = unique_rows(x)
+                    stats.add_count("dedup: valid pixels", len(inverse))
+                    stats.add_count("dedup: unique pixels", len(index))
+                    x = x[index]
+
+                # skip spectra scored in recent tiles
+                todo = _np.repeat(True, x.shape[0])
+                if recent is not None:
+                    keys = keys.tolist()
+                    found, values = recent.get(keys)
+                    todo = ~found
+                    stats.add_count("dedup: cache hits", int(found.sum()))
+
+                # the feature cache needs every pixel transformed
+                if staged is not None:
+                    x = transform(x)
+                    transformed = True
+                    tile = _np.full(
+                        (ys * xs, staged["features"].shape[2]), _np.nan, _np.float32
+                    )
+                    tile[valid] = x if inverse is None else x[inverse]
+                    staged["features"][
+                        yoff : yoff + ys, xoff : xoff + xs
+                    ] = tile.reshape(ys, xs, -1)
+
+                scored = _np.empty((len(todo), n_classes), dtype=_np.float32)
+                if todo.any():
+                    x = x if todo.all() else x[todo]
+                    scored[todo] = predict(x if transformed else transform(x))
+
+                if recent is not None:
+                    if found.any():
+                        scored[found] = [v for v in values if v is not None]
+                    recent.put(
+                        [key for key, new in zip(keys, todo) if new], scored[todo]
+                    )
+
+                # scatter the unique results back to every pixel
+                if inverse is not None:
+                    scored = scored[inverse]
+                prob[:, valid] = scored.T
+
+            stats.add_time("compute", "busy", _time.perf_counter() - start)
+            stats.add_tile("compute")
+            runner.put(
+                write_queue,
+                (window, prob.reshape(n_classes, ys, xs)),
+                "compute",
+                "write",
+            )
+
+    def writer():
+        n_done = 0
+        while n_done < n_workers:
+            item = runner.get(write_queue, "write")
+            if item is None:
+                n_done += 1
+                continue
+
+            (xoff, yoff, xs, ys), prob = item
+            start = _time.perf_counter()
+            output.write_window(prob, xoff, yoff)
+            stats.add_time("write", "busy", _time.perf_counter() - start)
+            stats.add_tile("write")
+
+    threads = [runner.thread(reader if cached is None else cache_reader)]
+    threads += [runner.thread(writer)]
+    threads += [runner.thread(compute) for i in range(n_workers)]
+    for thread in threads:
+        thread.join()
+
+    # flush the output and release the file handles
+    output.close()
+    raster.close()
+
+    if runner.errors:
+        if staged is not None:
+            cache.discard(cache_key)
+        raise runner.errors[0]
+
+    if staged is not None:
+        cache.commit(cache_key, staged)
+
+    if verbose:
+        stats.report({"read": 1, "compute": n_workers, "write": 1})
+        if dedup:
+            n_valid = stats.counts.get("dedup: valid pixels", 0)
+            n_unique = stats.counts.get("dedup: unique pixels", 0)
+            _prnt.status(
+                "Predicted {:.1%} of valid pixels after deduplication".format(
+                    n_unique / max(n_valid, 1)
+                )
+            )
+        if recent is not None:
+            _prnt.status(
+                "Spectra cache hit rate: {:.1%} ({} entries)".format(
+                    recent.hits / max(recent.hits + recent.misses, 1), len(recent)
+                )
+            )
+
+    return stats
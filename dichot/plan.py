@@ -0,0 +1,254 @@
+"""Methods for choosing raster tile sizes and worker counts from a memory budget
+
+The tile pipeline (see pipeline.apply_raster()) holds a fixed number of tiles in
+memory: the recycled input buffers, the working arrays of each compute thread and
+the probability tiles waiting to be written. These functions estimate that peak
+footprint per pixel from the raster and model properties, then pick the largest
+tiles and the most workers that keep the estimate under budget.
+"""
+import math as _math
+
+import numpy as _np
+
+from . import prnt as _prnt
+from . import read as _read
+
+# the tile widths to consider, largest first
+tile_sizes = [2048, 1536, 1024, 768, 512, 384, 256, 192, 128, 96, 64, 32, 16]
+
+# the smallest tile width worth keeping more workers busy for
+min_tile_size = 128
+
+# the approximate python object overhead in bytes of each spectrum cache entry
+#  (see pipeline.memo): the bytes key, the probability array and the dictionary slot
+memo_overhead = 250
+
+
+def pixel_bytes(
+    n_bands,
+    itemsize,
+    n_features,
+    n_classes,
+    n_members,
+    fused=False,
+    dedup=False,
+    dedup_cache=0,
+):
+    """Estimates the bytes each pipeline stage holds per tile pixel
+
+    Args:
+        n_bands     - the number of bands read from the input raster
+        itemsize    - the number of bytes per input value (e.g., 2 for int16)
+        n_features  - the number of features after model.transform()
+        n_classes   - the number of output classes
+        n_members   - the number of models in the ensemble
+        fused       - flag for tiles transformed with the fused float32 affine step
+                      (see transform.affine()), which skips the float64 reducer copies
+        dedup       - flag for tiles whose distinct spectra are predicted once
+                      (see pipeline.unique_rows())
+        dedup_cache - the number of spectra remembered across tiles. implies dedup
+
+    Returns:
+        a dictionary with the bytes per pixel of each input buffer ('buffer'),
+        each compute thread's working arrays ('compute') and each output tile ('output')
+    """
+    # the valid pixel copy, the no-data test, the float64 reducer input and output.
+    #  the fused step only converts a fixed-size chunk of rows at a time
+    if fused:
+        transform = n_bands * itemsize + n_bands + 4 * n_features
+    else:
+        transform = n_bands * itemsize + n_bands + 8 * n_bands + 8 * n_features
+
+    # each member's probabilities, the appended model stack (copied on each append),
+    #  the averaged probabilities and the float32 output tile
+    predict = 8 * n_classes * (1 + 2 * n_members + 1) + 4 * n_classes
+
+    # the sorted row copy and unique keys, plus the int64 sort order, index and inverse.
+    #  the cache lookups also convert each key to a bytes object in a list
+    dedup_bytes = 0
+    if dedup or dedup_cache > 0:
+        dedup_bytes = 2 * n_bands * itemsize + 24
+    if dedup_cache > 0:
+        dedup_bytes += n_bands * itemsize + 33 + 8
+
+    return {
+        "buffer": n_bands * itemsize,
+        "compute": transform + predict + dedup_bytes,
+        "output": 4 * n_classes,
+    }
+
+
+def footprint(per_pixel, tile_pixels, n_workers, n_buffers=None, fixed=0):
+    """Estimates the peak memory use of the tile pipeline
+
+    Args:
+        per_pixel   - the dictionary returned by pixel_bytes()
+        tile_pixels - the number of pixels in the largest tile
+        n_workers   - the number of compute threads
+        n_buffers   - the number of recycled input buffers. defaults to 2 * n_workers
+        fixed       - bytes used regardless of tile size (e.g., the loaded model)
+
+    Returns:
+        the estimated peak memory use in bytes
+    """
+    if n_buffers is None:
+        n_buffers = 2 * n_workers
+
+    # the write queue holds 2 tiles per worker, plus the tile being written
+    n_outputs = 2 * n_workers + 1
+
+    per_tile = (
+        n_buffers * per_pixel["buffer"]
+        + n_workers * per_pixel["compute"]
+        + n_outputs * per_pixel["output"]
+    )
+
+    return fixed + tile_pixels * per_tile
+
+
+def choose(nx, ny, per_pixel, max_memory, cpus=1, fixed=0, headroom=0.8, sizes=None):
+    """Picks the tile size and number of workers that fit in a memory budget
+
+    Workers are preferred over larger tiles, as long as tiles stay at least
+    min_tile_size pixels wide. The worker count is capped at the number of tiles.
+
+    Args:
+        nx         - the number of raster columns
+        ny         - the number of raster rows
+        per_pixel  - the dictionary returned by pixel_bytes()
+        max_memory - the memory budget in bytes
+        cpus       - the maximum number of compute threads
+        fixed      - bytes used regardless of tile size (e.g., the loaded model)
+        headroom   - the fraction of max_memory the estimate may use
+        sizes      - the tile widths to consider. defaults to plan.tile_sizes
+
+    Returns:
+        a dictionary with the 'tile_size', 'n_workers', 'n_buffers', 'n_tiles',
+        'estimate' (bytes) and 'max_memory' (bytes) of the plan
+    """
+    if sizes is None:
+        sizes = tile_sizes
+    sizes = sorted(sizes, reverse=True)
+    budget = max_memory * headroom
+
+    def fits(size, n_workers):
+        pixels = min(size, nx) * min(size, ny)
+        return footprint(per_pixel, pixels, n_workers, fixed=fixed) <= budget
+
+    def n_tiles(size):
+        return _math.ceil(nx / size) * _math.ceil(ny / size)
+
+    selected = None
+    for n_workers in range(max(cpus, 1), 0, -1):
+        for size in sizes:
+            if n_tiles(size) >= n_workers and fits(size, n_workers):
+                selected = (size, n_workers)
+                break
+        if selected is not None and selected[0] >= min(min_tile_size, max(nx, ny)):
+            break
+        selected = None
+
+    # fall back to the largest tile that fits with one worker
+    if selected is None:
+        for size in sizes:
+            if fits(size, 1):
+                selected = (size, 1)
+                break
+
+    if selected is None:
+        raise ValueError(
+            "Unable to fit a {} pixel tile in {:.2f} GB of memory".format(
+                sizes[-1], max_memory / 1e9
+            )
+        )
+
+    size, n_workers = selected
+    pixels = min(size, nx) * min(size, ny)
+
+    return {
+        "tile_size": size,
+        "n_workers": n_workers,
+        "n_buffers": 2 * n_workers,
+        "n_tiles": n_tiles(size),
+        "estimate": footprint(per_pixel, pixels, n_workers, fixed=fixed),
+        "max_memory": max_memory,
+    }
+
+
+def memo_bytes(n_entries, n_bands, itemsize, n_classes):
+    """Estimates the memory held by a full spectrum cache (see pipeline.memo)
+
+    Args:
+        n_entries - the maximum number of cached spectra
+        n_bands   - the number of bands in each spectrum key
+        itemsize  - the number of bytes per input value
+        n_classes - the number of float32 probabilities stored per spectrum
+
+    Returns:
+        the estimated size in bytes
+    """
+    return n_entries * (n_bands * itemsize + 4 * n_classes + memo_overhead)
+
+
+def apply_raster(
+    model, raster, max_memory, cpus=1, fixed=0, fused=False, dedup=False, dedup_cache=0
+):
+    """Plans the tile size and number of workers for applying a model to a raster
+
+    Args:
+        model       - a fitted dichot model object
+        raster      - a read.raster object with the input metadata
+        max_memory  - the memory budget in bytes
+        cpus        - the maximum number of compute threads
+        fixed       - bytes used regardless of tile size (e.g., the model file size)
+        fused       - flag for tiles transformed with the fused affine step
+        dedup       - flag for predicting each distinct spectrum in a tile once
+        dedup_cache - the number of spectra remembered across tiles. implies dedup
+
+    Returns:
+        the plan dictionary returned by plan.choose()
+    """
+    if model.good_bands_ is not None:
+        n_bands = int(_np.sum(model.good_bands_))
+    else:
+        n_bands = raster.nb
+
+    itemsize = _np.dtype(_read.numpy_dtype(raster.dt)).itemsize
+    n_classes = len(model.labels_)
+    n_features = model.transform(_np.zeros((1, n_bands)), subset=False).shape[1]
+    per_pixel = pixel_bytes(
+        n_bands,
+        itemsize,
+        n_features,
+        n_classes,
+        model.n_models_,
+        fused=fused,
+        dedup=dedup,
+        dedup_cache=dedup_cache,
+    )
+
+    # the spectrum cache is shared by all workers and grows to its full size
+    fixed += memo_bytes(dedup_cache, n_bands, itemsize, n_classes)
+
+    return choose(raster.nx, raster.ny, per_pixel, max_memory, cpus=cpus, fixed=fixed)
+
+
+def report(plan):
+    """Prints a tile plan
+
+    Args:
+        plan - the plan dictionary returned by plan.choose()
+
+    Returns:
+        None
+    """
+    _prnt.status(
+        "Tile plan: {0} x {0} pixel tiles ({1} total), {2} worker(s), {3} buffers".format(
+            plan["tile_size"], plan["n_tiles"], plan["n_workers"], plan["n_buffers"]
+        )
+    )
+    _prnt.status(
+        "Estimated peak memory: {:.2f} GB of {:.2f} GB".format(
+            plan["estimate"] / 1e9, plan["max_memory"] / 1e9
+        )
+    )
@@ -1,6 +1,8 @@
 """Methods for formatted printing
 """
-from sklearn import metrics as _metrics
+from . import _lazy
+
+_metrics = _lazy.module("sklearn.metrics")
 
 
 def status(msg):
@@ -15,6 +17,10 @@ def line_break():
     print("[ ------ ]")
 
 
-def model_report(ytrue, ypred, yprob):
+def model_report(ytrue, ypred, yprob, labels=None):
     status("Mean accuracy score: {}".format(_metrics.accuracy_score(ytrue, ypred)))
-    status("Mean log loss score: {}".format(_metrics.log_loss(ytrue, yprob)))
+    status(
+        "Mean log loss score: {}".format(
+            _metrics.log_loss(ytrue, yprob, labels=labels)
+        )
+    )
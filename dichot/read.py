@@ -2,11 +2,12 @@
 """
 import os as _os
 import pickle as _pickle
-from osgeo import gdal as _gdal
 import numpy as _np
-import pandas as _pd
+from . import _lazy
 
-_gdal.UseExceptions()
+_gdal = _lazy.module("osgeo.gdal", on_import=lambda gdal: gdal.UseExceptions())
+_gdal_array = _lazy.module("osgeo.gdal_array")
+_pd = _lazy.module("pandas")
 
 
 def bands(path):
@@ -90,6 +91,23 @@ def training_data(path):
     return [crown_id, features]
 
 
+def training_data_chunks(path, chunk_size=100000):
+    """Reads the input training data from a csv file in chunks
+    (based on ccb-id/support_files/training.csv)
+
+    Args:
+        path       - the path to the training data csv file
+        chunk_size - the number of rows to read at a time
+
+    Returns:
+        a generator of [crown_id, features] lists for each chunk
+        crown_id   - an array of per-sample crown IDs
+        features   - an array of input feature data with shape (n_samples, n_features)
+    """
+    for df in _pd.read_csv(path, chunksize=chunk_size):
+        yield [_np.array(df.iloc[:, 0]), _np.array(df.iloc[:, 1:])]
+
+
 def is_raster(path):
     """Tests if a file is a raster (i.e., gdal readable)
 
@@ -124,6 +142,48 @@ def is_csv(path):
         return False
 
 
+def configure(cache_size=None, threads=None):
+    """Sets gdal's block cache size and threading options for this process
+
+    Args:
+        cache_size - the maximum size of the gdal block cache in bytes
+        threads    - the number of threads gdal may use for (de)compression.
+                     an integer or 'ALL_CPUS'
+
+    Returns:
+        None
+    """
+    if cache_size is not None:
+        _gdal.SetCacheMax(int(cache_size))
+
+    if threads is not None:
+        _gdal.SetConfigOption("GDAL_NUM_THREADS", str(threads))
+
+
+def numpy_dtype(dt):
+    """Converts a gdal data type code to the matching numpy data type
+
+    Args:
+        dt - the gdal data type code (e.g., raster.dt)
+
+    Returns:
+        the numpy dtype
+    """
+    return _np.dtype(_gdal_array.GDALTypeCodeToNumericTypeCode(dt))
+
+
+def gdal_dtype(dtype):
+    """Converts a numpy data type to the matching gdal data type code
+
+    Args:
+        dtype - the numpy dtype (e.g., numpy.float32)
+
+    Returns:
+        the gdal data type code
+    """
+    return _gdal_array.NumericTypeCodeToGDALTypeCode(_np.dtype(dtype))
+
+
 def pck(path):
     """Reads a python/pickle format data file
 
@@ -133,7 +193,7 @@ def pck(path):
     Returns:
         the object stored in the pickle file
     """
-    with open(path, "r") as f:
+    with open(path, "rb") as f:
         return _pickle.load(f)
 
 
@@ -141,6 +201,11 @@ class raster:
     def __init__(self, input_file):
         """Reads metadata from a raster file and stores it in an object
 
+        The gdal file handle is kept open and reused by the read/write methods. It is
+        reopened automatically in a new process (e.g., a forked worker), when switching
+        from read-only to update mode, and after close(). Use the object as a context
+        manager to close the handle when done.
+
         Args:
             input_file: a path to a raster file to read
 
@@ -151,8 +216,9 @@ class raster:
         """
 
         # read the gdal reference as read-only
-        ref = _gdal.Open(input_file, 0)
         self.file_name = input_file
+        self._refs = {}
+        ref = self._handle()
 
         # get file dimensions
         self.nx = ref.RasterXSize
@@ -184,10 +250,79 @@ class raster:
         # get driver info
         self.driver_name = ref.GetDriver().ShortName
 
-        # kill the gdal references
-        ref = None
+        # kill the band reference
         band = None
 
+    def _handle(self, update=False):
+        """Returns the open gdal reference, (re)opening it if needed
+
+        Args:
+            update: set to True to open the file for writing
+
+        Returns:
+            a gdal dataset object
+        """
+        # handles are stored as {pid: [ref, update]}. handles inherited from a parent
+        #  process aren't safe to use, but they stay referenced so a forked child never
+        #  closes (and flushes) the parent's dataset
+        pid = _os.getpid()
+        entry = self._refs.get(pid)
+        if entry is None or (update and not entry[1]):
+            self._refs.pop(pid, None)
+            self._refs[pid] = [_gdal.Open(self.file_name, 1 if update else 0), update]
+
+        return self._refs[pid][0]
+
+    def close(self):
+        """Flushes and closes this process's gdal file handle. It is reopened on next use
+
+        Args:
+
+        Returns:
+            None.
+        """
+        entry = self._refs.pop(_os.getpid(), None)
+        if entry is not None:
+            entry[0].FlushCache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __getstate__(self):
+        # gdal handles can't be pickled. the receiving process opens its own
+        state = self.__dict__.copy()
+        state["_refs"] = {}
+        return state
+
+    def scaling(self, bands=None):
+        """Reads the scale and offset that convert stored values to physical units
+
+        Args:
+            bands: a list of 1-based band indices. reads all bands if None
+
+        Returns:
+            list of [scale, offset] arrays with one value per band, where
+            physical values = stored values * scale + offset. bands without
+            scale or offset metadata get 1 and 0
+        """
+        if bands is None:
+            bands = range(1, self.nb + 1)
+
+        ref = self._handle()
+        scale, offset = [], []
+        for band in bands:
+            b = ref.GetRasterBand(int(band))
+            scale.append(b.GetScale())
+            offset.append(b.GetOffset())
+
+        scale = _np.array([1.0 if s is None else s for s in scale])
+        offset = _np.array([0.0 if o is None else o for o in offset])
+
+        return [scale, offset]
+
     # a function to read raster data from a single band
     def read_band(self, band):
         """Reads the raster data from a user-specified band into the self.data variable
@@ -199,9 +334,9 @@ class raster:
             the aei.Raster object with the object.data variable updated with a
             numpy array of raster values
         """
-        ref = _gdal.Open(self.file_name, 0)
-        band = ref.GetRasterBand(band)
+        band = self._handle().GetRasterBand(band)
         self.data = band.ReadAsArray()
+        return self
 
     # a function to read raster data from all bands
     def read_all(self):
@@ -213,8 +348,38 @@ class raster:
             the aei.raster object with the object.data variable updated with a
             numpy array of raster values
         """
-        ref = _gdal.Open(self.file_name, 0)
-        self.data = ref.ReadAsArray()
+        self.data = self._handle().ReadAsArray()
+        return self
+
+    def read_window(self, xoff, yoff, xsize, ysize, bands=None, out=None):
+        """Reads a rectangular window of raster data
+
+        Args:
+            xoff : the first column to read
+            yoff : the first row to read
+            xsize: the number of columns to read
+            ysize: the number of rows to read
+            bands: a list of 1-based band indices to read. reads all bands if None
+            out  : an optional contiguous array with shape (n_bands, ysize, xsize) to
+                   read into, so buffers can be reused between windows
+
+        Returns:
+            a numpy array with shape (n_bands, ysize, xsize) in the raster's data type
+        """
+        if bands is None:
+            bands = range(1, self.nb + 1)
+        bands = [int(band) for band in bands]
+
+        if out is None:
+            out = _np.empty((len(bands), ysize, xsize), dtype=numpy_dtype(self.dt))
+
+        ref = self._handle()
+        for i, band in enumerate(bands):
+            ref.GetRasterBand(band).ReadAsArray(
+                xoff, yoff, xsize, ysize, buf_obj=out[i]
+            )
+
+        return out
 
     # a function to write raster data to a single band
     def write_band(self, band, data):
@@ -227,8 +392,7 @@ class raster:
         Returns:
             None.
         """
-        ref = _gdal.Open(self.file_name, 1)
-        band = ref.GetRasterBand(band)
+        band = self._handle(update=True).GetRasterBand(band)
         band.WriteArray(data)
 
     # a function to write raster data to all bands
@@ -241,13 +405,35 @@ class raster:
         Returns:
             None.
         """
-        ref = _gdal.Open(self.file_name, 1)
-
         # see which data to write
-        if data:
-            ref.WriteRaster(data)
-        else:
-            ref.WriteRaster(self.data)
+        if data is None:
+            data = self.data
+
+        self.write_window(data, 0, 0)
+
+    def write_window(self, data, xoff, yoff, bands=None):
+        """Writes a rectangular window of raster data
+
+        Args:
+            data : a numpy array with shape (n_bands, ysize, xsize), or (ysize, xsize)
+                   for a single band
+            xoff : the first column to write
+            yoff : the first row to write
+            bands: a list of 1-based band indices to write. writes to bands
+                   1 to n_bands if None
+
+        Returns:
+            None.
+        """
+        if data.ndim == 2:
+            data = data[_np.newaxis]
+
+        if bands is None:
+            bands = range(1, data.shape[0] + 1)
+
+        ref = self._handle(update=True)
+        for i, band in enumerate(bands):
+            ref.GetRasterBand(int(band)).WriteArray(data[i], xoff, yoff)
 
     def write_metadata(self, ref=None):
         """Updates the metadata of a file if changed by the user
@@ -259,7 +445,7 @@ class raster:
             None
         """
         if ref is None:
-            ref = _gdal.Open(self.file_name, 1)
+            ref = self._handle(update=True)
 
         # update projection and geotransform at file-level
         ref.SetProjection(self.prj)
@@ -291,8 +477,9 @@ class raster:
         """
         import copy as cp
 
-        # create a copy of the input object to manipulate
+        # create a copy of the input object to manipulate. it opens its own file handle
         new_obj = cp.copy(self)
+        new_obj._refs = {}
 
         # update with the new parameters
         new_obj.file_name = file_name
@@ -319,7 +506,7 @@ class raster:
         # set the projection and geotransform parameters
         new_obj.write_metadata(ref=ref)
 
-        # kill the reference and return the new object
-        ref = None
+        # keep the new reference open for writing
+        new_obj._refs = {_os.getpid(): [ref, True]}
 
         return new_obj
@@ -2,6 +2,8 @@
 """
 import numpy as _np
 
+from ._core import encode_labels as _encode_labels
+
 
 def uniform(features, crown_labels, n_per_class=400, other_array=None):
     """Performs a random uniform resampling of each class to a fixed number of samples
@@ -17,9 +19,12 @@ def uniform(features, crown_labels, n_per_class=400, other_array=None):
         resample_x   - the feature data resampled with shape (n_lables * n_per_class, n_features)
         resample_y   - the class labels from 0 to n_unique_labels with shape (n_lables * n_per_class)
     """
-    # get the unique species labels for balanced-class resampling
-    unique_labels = _np.unique(crown_labels)
+    # get the unique species labels for balanced-class resampling, and group
+    #  the samples of each class together in one pass
+    unique_labels, codes, counts = _encode_labels(crown_labels)
     n_labels = len(unique_labels)
+    order = _np.argsort(codes, kind="stable")
+    starts = _np.concatenate(([0], _np.cumsum(counts)[:-1]))
 
     # set up the x and y variables for storing outputs
     resample_x = _np.zeros((n_labels * n_per_class, features.shape[1]))
@@ -33,21 +38,232 @@ def uniform(features, crown_labels, n_per_class=400, other_array=None):
 
     # loop through and randomly sample each species
     for i in range(n_labels):
-        ind_class = _np.where(crown_labels == unique_labels[i])
-        ind_randm = _np.random.randint(0, high=ind_class[0].shape[0], size=n_per_class)
+        ind_class = order[starts[i] : starts[i] + counts[i]]
+        ind_randm = _np.random.randint(0, high=counts[i], size=n_per_class)
 
         # assign the random samples to the balanced class outputs
         resample_x[i * n_per_class : (i + 1) * n_per_class] = features[
-            ind_class[0][ind_randm]
+            ind_class[ind_randm]
         ]
         resample_y[i * n_per_class : (i + 1) * n_per_class] = i
 
         if other_array is not None:
             resample_o[i * n_per_class : (i + 1) * n_per_class] = other_array[
-                ind_class[0][ind_randm]
+                ind_class[ind_randm]
             ]
 
     if other_array is None:
         return [resample_x, resample_y]
     else:
         return [resample_x, resample_y, resample_o]
+
+
+def balance(labels, n_per_class=400, replace=True, seed=None):
+    """Selects a class-balanced subset of samples (e.g., to re-balance after outlier removal)
+
+    Args:
+        labels      - the class label for each sample
+        n_per_class - the number of samples to select per class
+        replace     - flag to sample with replacement, so every class gets n_per_class
+                      samples. without replacement, classes with fewer than n_per_class
+                      samples keep all of them
+        seed        - the random seed or numpy Generator used for sampling
+
+    Returns:
+        index       - the indices of the selected samples, grouped by class
+    """
+    rng = _np.random.default_rng(seed)
+    unique_labels, codes, counts = _encode_labels(labels)
+    order = _np.argsort(codes, kind="stable")
+    starts = _np.concatenate(([0], _np.cumsum(counts)[:-1]))
+
+    index = []
+    for start, count in zip(starts, counts):
+        ind_class = order[start : start + count]
+        if replace:
+            index.append(ind_class[rng.integers(0, count, size=n_per_class)])
+        else:
+            index.append(rng.permutation(ind_class)[:n_per_class])
+
+    return _np.concatenate(index)
+
+
+class reservoir:
+    def __init__(
+        self,
+        n_per_class=400,
+        replace=True,
+        max_per_crown=None,
+        seed=None,
+        dtype=_np.float32,
+    ):
+        """Creates a streaming, class-balanced sampler that keeps a fixed-size reservoir per class
+
+        Feature data are passed in chunks (e.g., csv chunks, memory maps or raster
+        tiles) with add(), so the full pool of samples is never held in memory.
+
+        Args:
+            n_per_class   - the number of samples to keep per class
+            replace       - flag to sample with replacement. each slot then holds an
+                            independent uniform draw from the class. without replacement,
+                            classes with fewer than n_per_class samples keep all of them
+            max_per_crown - the maximum number of samples per crown in each reservoir.
+                            requires crown IDs to be passed to add()
+            seed          - the random seed or numpy Generator used for sampling
+            dtype         - the data type of the sampled features
+
+        Returns:
+            a reservoir object to add() chunks to and sample() from
+        """
+        self.n_per_class = n_per_class
+        self.replace = replace
+        self.max_per_crown = max_per_crown
+        self.rng = _np.random.default_rng(seed)
+        self.dtype = dtype
+        self.labels_ = None
+        self._pools = {}
+
+    def _pool(self, label, n_features, crown_dtype):
+        if label not in self._pools:
+            k = self.n_per_class
+            self._pools[label] = {
+                "x": _np.zeros((k, n_features), dtype=self.dtype),
+                "crowns": _np.zeros(k, dtype=crown_dtype),
+                "filled": _np.zeros(k, dtype=bool),
+                "seen": 0,
+                "counts": {},
+            }
+
+        return self._pools[label]
+
+    def _insert(self, pool, slot, features, row, crown_id):
+        # puts a sample into a slot if its crown isn't already at the cap
+        if crown_id is not None and self.max_per_crown is not None:
+            counts = pool["counts"]
+            crown = crown_id[row]
+            old = pool["crowns"][slot] if pool["filled"][slot] else None
+            if crown != old and counts.get(crown, 0) >= self.max_per_crown:
+                return
+            if old is not None:
+                counts[old] -= 1
+            counts[crown] = counts.get(crown, 0) + 1
+
+        pool["x"][slot] = features[row]
+        if crown_id is not None:
+            pool["crowns"][slot] = crown_id[row]
+        pool["filled"][slot] = True
+
+    def _assign(self, pool, slots, rows, features, crown_id):
+        # stores samples in slots in order, sequentially if crowns are capped
+        if self.max_per_crown is None:
+            pool["x"][slots] = features[rows]
+            if crown_id is not None:
+                pool["crowns"][slots] = crown_id[rows]
+            pool["filled"][slots] = True
+        else:
+            for slot, row in zip(slots, rows):
+                self._insert(pool, slot, features, row, crown_id)
+
+    def _add_with_replacement(self, pool, rows, features, crown_id):
+        # each slot is an independent draw from all samples seen so far, so after
+        #  s samples it is replaced by one of m new samples with probability m / (s + m)
+        k, s, m = self.n_per_class, pool["seen"], len(rows)
+        replace = self.rng.random(k) < m / (s + m)
+        replace |= ~pool["filled"]
+        slots = _np.where(replace)[0]
+        picks = rows[self.rng.integers(0, m, size=len(slots))]
+        self._assign(pool, slots, picks, features, crown_id)
+
+    def _add_without_replacement(self, pool, rows, features, crown_id):
+        # reservoir sampling (algorithm R): the t-th sample seen replaces a random
+        #  slot with probability k / (t + 1)
+        k, s, m = self.n_per_class, pool["seen"], len(rows)
+        t = s + _np.arange(m)
+        draws = self.rng.integers(0, t + 1)
+
+        # fill the empty slots first
+        n_empty = k - pool["filled"].sum()
+        n_fill = 0
+        if n_empty > 0:
+            if self.max_per_crown is None:
+                n_fill = min(n_empty, m)
+                empty = _np.where(~pool["filled"])[0][:n_fill]
+                self._assign(pool, empty, rows[:n_fill], features, crown_id)
+            else:
+                while n_fill < m and not pool["filled"].all():
+                    slot = _np.argmin(pool["filled"])
+                    self._insert(pool, slot, features, rows[n_fill], crown_id)
+                    n_fill += 1
+
+        # then replace at random, keeping the last of multiple writes to the same slot
+        later = _np.arange(n_fill, m)
+        later = later[draws[later] < k]
+        if self.max_per_crown is None:
+            reverse = later[::-1]
+            slots, first = _np.unique(draws[reverse], return_index=True)
+            later = reverse[first]
+        self._assign(pool, draws[later], rows[later], features, crown_id)
+
+    def add(self, features, labels, crown_id=None):
+        """Adds a chunk of samples to the class reservoirs
+
+        Args:
+            features - the feature data with shape (n_samples, n_features)
+            labels   - the class label for each sample
+            crown_id - the crown ID for each sample. required if max_per_crown is set
+
+        Returns:
+            None. Updates the per-class reservoirs
+        """
+        if self.max_per_crown is not None and crown_id is None:
+            raise ValueError("Crown IDs are required to cap samples per crown")
+
+        features = _np.asarray(features)
+        if crown_id is not None:
+            crown_id = _np.asarray(crown_id)
+            crown_dtype = crown_id.dtype
+        else:
+            crown_dtype = _np.int64
+
+        # group the rows by class, keeping the order they were streamed in
+        classes, codes, counts = _encode_labels(labels)
+        order = _np.argsort(codes, kind="stable")
+        bounds = _np.concatenate(([0], _np.cumsum(counts)))
+
+        for i, label in enumerate(classes):
+            rows = order[bounds[i] : bounds[i + 1]]
+            pool = self._pool(label, features.shape[1], crown_dtype)
+            if self.replace:
+                self._add_with_replacement(pool, rows, features, crown_id)
+            else:
+                self._add_without_replacement(pool, rows, features, crown_id)
+            pool["seen"] += len(rows)
+
+    def sample(self):
+        """Returns the balanced training data from the class reservoirs
+
+        Args:
+            None
+
+        Returns:
+            list of [resample_x, resample_y, resample_crowns]
+            resample_x      - the sampled feature data with shape (n_samples, n_features)
+            resample_y      - the class labels from 0 to n_unique_labels, indexing self.labels_
+            resample_crowns - the crown ID of each sample (all zeros if not passed to add())
+        """
+        classes = sorted(self._pools)
+        self.labels_ = _np.array(classes)
+
+        x, y, crowns = [], [], []
+        for i, label in enumerate(classes):
+            pool = self._pools[label]
+            filled = pool["filled"]
+            x.append(pool["x"][filled])
+            y.append(_np.repeat(i, filled.sum()))
+            crowns.append(pool["crowns"][filled])
+
+        resample_y = _np.concatenate(y).astype(
+            _np.min_scalar_type(max(len(classes) - 1, 0))
+        )
+
+        return [_np.concatenate(x), resample_y, _np.concatenate(crowns)]
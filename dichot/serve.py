@@ -0,0 +1,311 @@
+"""A persistent prediction server that keeps a dichot model loaded in memory
+
+Clients POST feature arrays in numpy .npy format to /predict and receive the
+class probabilities back as a .npy array. Concurrent requests are gathered into
+micro-batches so the model runs a single predict_proba call per batch.
+"""
+import io as _io
+import json as _json
+import queue as _queue
+import threading as _threading
+import time as _time
+from http import server as _server
+from urllib import request as _request
+
+import numpy as _np
+
+from . import prnt as _prnt
+
+# the content type used for binary array payloads
+content_type = "application/x-npy"
+
+
+def encode(array):
+    """Serializes an array to .npy bytes
+
+    Args:
+        array - the numpy array to serialize
+
+    Returns:
+        a bytes object in numpy .npy format
+    """
+    buf = _io.BytesIO()
+    _np.save(buf, array, allow_pickle=False)
+    return buf.getvalue()
+
+
+def decode(payload):
+    """Reads an array from .npy bytes
+
+    Args:
+        payload - a bytes object in numpy .npy format
+
+    Returns:
+        the deserialized numpy array
+    """
+    return _np.load(_io.BytesIO(payload), allow_pickle=False)
+
+
+def predict(features, url="http://127.0.0.1:8765"):
+    """Requests prediction probabilities from a running dc-serve instance
+
+    Args:
+        features - an array of features with shape (n_samples, n_features)
+        url      - the base url of the server
+
+    Returns:
+        an array of class probabilities with shape (n_samples, n_classes)
+    """
+    req = _request.Request(
+        url.rstrip("/") + "/predict",
+        data=encode(_np.ascontiguousarray(features)),
+        headers={"Content-Type": content_type},
+    )
+    with _request.urlopen(req) as response:
+        return decode(response.read())
+
+
+class batcher:
+    def __init__(
+        self,
+        model,
+        max_batch=65536,
+        max_wait=0.002,
+        use_calibrated=None,
+        transform=True,
+    ):
+        """Collects concurrent prediction requests into micro-batches evaluated by one thread
+
+        Args:
+            model          - a fitted dichot model object
+            max_batch      - the maximum number of rows to gather into a single batch
+            max_wait       - the time in seconds to wait for more requests after the first arrives
+            use_calibrated - boolean for whether to use the calibrated models. defaults to
+                             using them if the model has been calibrated
+            transform      - flag to apply the model's band subset and reducer to the inputs.
+                             set to False if clients send already-transformed features
+
+        Returns:
+            a batcher object. call batcher.submit() from any thread. raises a ValueError
+            for crown feature models unless transform is False
+        """
+        # crown summary models need every pixel of a crown at once, not independent rows
+        if transform and getattr(model, "crown_percentiles_", None) is not None:
+            raise ValueError(
+                "Crown feature models can't be served on pixel features. "
+                "Send crown summaries with transform=False (--transformed) instead"
+            )
+
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        if use_calibrated is None:
+            use_calibrated = model.is_calibrated_
+        self.use_calibrated = use_calibrated
+        self.transform = transform
+        self.n_features_ = self._n_features()
+
+        # running counts to report on batching efficiency
+        self.n_requests = 0
+        self.n_batches = 0
+        self.n_rows = 0
+
+        self._queue = _queue.Queue()
+        self._thread = _threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _n_features(self):
+        # the number of input columns each request must have, or None if unknown
+        if self.transform:
+            if self.model.good_bands_ is not None:
+                return len(self.model.good_bands_)
+            if self.model.reducer is not None:
+                return getattr(self.model.reducer, "n_features_in_", None)
+            if getattr(self.model, "selected_features_", None) is not None:
+                return None
+
+        members = getattr(self.model, "models_", None)
+        if members is None:
+            members = [getattr(self.model, "genus_model_", None)]
+        return getattr(members[0], "n_features_in_", None)
+
+    def check(self, features):
+        """Checks a request's features can be batched with other requests
+
+        Args:
+            features - an array of features
+
+        Returns:
+            None. Raises a ValueError if features isn't a non-empty, numeric 2-d array
+            with n_features_ columns
+        """
+        if features.dtype.kind not in "biuf":
+            raise ValueError(
+                "Expected numeric features, got dtype {}".format(features.dtype)
+            )
+
+        if features.ndim != 2:
+            raise ValueError(
+                "Expected a 2-d feature array, got {} dimension(s)".format(
+                    features.ndim
+                )
+            )
+
+        if features.shape[0] == 0:
+            raise ValueError("Expected at least one row of features")
+
+        if self.n_features_ is not None and features.shape[1] != self.n_features_:
+            raise ValueError(
+                "Expected {} features per row, got {}".format(
+                    self.n_features_, features.shape[1]
+                )
+            )
+
+    def submit(self, features):
+        """Queues features for prediction and waits for the result
+
+        Args:
+            features - an array of features with shape (n_samples, n_features)
+
+        Returns:
+            an array of class probabilities with shape (n_samples, n_classes)
+        """
+        item = {"x": features, "done": _threading.Event(), "y": None, "error": None}
+        self._queue.put(item)
+        item["done"].wait()
+
+        if item["error"] is not None:
+            raise item["error"]
+
+        return item["y"]
+
+    def _gather(self, batch):
+        # block until one request arrives, then collect more until full or timed out.
+        #  items are added to batch as they arrive so none are lost on an error
+        batch.append(self._queue.get())
+        n_rows = len(batch[0]["x"])
+        deadline = _time.perf_counter() + self.max_wait
+
+        while n_rows < self.max_batch:
+            timeout = deadline - _time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except _queue.Empty:
+                break
+            batch.append(item)
+            n_rows += len(item["x"])
+
+    def _run(self):
+        # errors are passed to the waiting requests so they never stop the thread
+        while True:
+            batch = []
+            try:
+                self._gather(batch)
+                self._predict(batch)
+            except Exception:
+                # retry each request on its own so only the failing ones get the error
+                for item in batch:
+                    if item["y"] is None and item["error"] is None:
+                        try:
+                            self._predict([item])
+                        except Exception as error:
+                            item["error"] = error
+
+            self.n_requests += len(batch)
+            self.n_batches += 1
+
+            for item in batch:
+                item["done"].set()
+
+    def _predict(self, batch):
+        x = _np.concatenate([item["x"] for item in batch], axis=0)
+        if self.transform:
+            x = self.model.transform(x)
+
+        prob = self.model.predict_proba(
+            x, use_calibrated=self.use_calibrated, average_proba=True
+        )
+
+        # send each request its own slice of the batch
+        splits = _np.cumsum([item["x"].shape[0] for item in batch])[:-1]
+        for item, y in zip(batch, _np.split(prob, splits)):
+            item["y"] = y
+
+        self.n_rows += sum([item["x"].shape[0] for item in batch])
+
+
+class _handler(_server.BaseHTTPRequestHandler):
+    # set on the subclass created in server()
+    batcher = None
+    verbose = False
+
+    def _send(self, code, body, ctype):
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/labels":
+            labels = [str(label) for label in self.batcher.model.labels_]
+            self._send(200, _json.dumps(labels).encode(), "application/json")
+
+        elif self.path == "/stats":
+            stats = {
+                "requests": self.batcher.n_requests,
+                "batches": self.batcher.n_batches,
+                "rows": self.batcher.n_rows,
+            }
+            self._send(200, _json.dumps(stats).encode(), "application/json")
+
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, b"not found", "text/plain")
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            features = decode(self.rfile.read(length))
+            if features.ndim == 1:
+                features = features[_np.newaxis, :]
+            self.batcher.check(features)
+        except ValueError as error:
+            self._send(400, str(error).encode(), "text/plain")
+            return
+
+        try:
+            prob = self.batcher.submit(features)
+        except Exception as error:
+            self._send(500, str(error).encode(), "text/plain")
+            return
+
+        self._send(200, encode(prob), content_type)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            _prnt.status(format % args)
+
+
+def server(batch, host="127.0.0.1", port=8765, verbose=False):
+    """Creates a threaded http server that routes requests through a batcher
+
+    Args:
+        batch   - a batcher object wrapping the model to serve
+        host    - the address to bind to
+        port    - the port to listen on
+        verbose - flag to log each request
+
+    Returns:
+        an http.server.ThreadingHTTPServer object. call .serve_forever() to run it
+    """
+    handler = type("handler", (_handler,), {"batcher": batch, "verbose": verbose})
+    httpd = _server.ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+
+    return httpd
@@ -1,8 +1,12 @@
 """Methods for transforming/decomposing reflectance data (e.g., using PCA)
 """
-from sklearn.decomposition import PCA as _PCA
+import numpy as _np
+
+from . import _lazy
 from . import read as _read
 
+_decomposition = _lazy.module("sklearn.decomposition")
+
 
 def pca(features, n_pcs=100):
     """PCA transformation function
@@ -14,7 +18,7 @@ def pca(features, n_pcs=100):
     Returns:
         an array of PCA-transformed features
     """
-    reducer = _PCA(n_components=n_pcs, whiten=True)
+    reducer = _decomposition.PCA(n_components=n_pcs, whiten=True)
     return reducer.fit_transform(features)
 
 
@@ -35,3 +39,89 @@ def from_path(path, features, n_features=None):
         return reducer, transformed
     else:
         return reducer, transformed[:, 0:n_features]
+
+
+def linear(model, scale=1.0, offset=0.0, dtype=_np.float32):
+    """Folds a model's input scaling, PCA reducer and feature subsets into one affine map
+
+    With stored values x (e.g., scaled int16 reflectance) and a PCA reducer, the model's
+    transform of (x * scale + offset) equals x @ weights + bias, where
+        weights = scale * components.T / sqrt(explained_variance) (if whitened)
+        bias    = (offset - mean) @ components.T / sqrt(explained_variance)
+    so raw values never need to be converted to scaled floats on their own.
+
+    Args:
+        model  - a fitted dichot model object
+        scale  - the factor converting stored values to model units. a scalar, or
+                 one value per good band
+        offset - the offset added after scaling. a scalar, or one value per good band
+        dtype  - the floating point type of the weights and bias
+
+    Returns:
+        list of [weights, bias] with shapes (n_bands, n_features) and (n_features),
+        or None if the model's reducer isn't PCA or IncrementalPCA
+    """
+    reducer = model.reducer
+
+    # only PCA is an affine map of its inputs (FactorAnalysis, FastICA, NMF etc. aren't)
+    if reducer is not None and not isinstance(
+        reducer, (_decomposition.PCA, _decomposition.IncrementalPCA)
+    ):
+        return None
+
+    if model.good_bands_ is not None:
+        n_bands = int(_np.sum(model.good_bands_))
+    elif reducer is not None:
+        n_bands = reducer.components_.shape[1]
+    else:
+        return None
+
+    scale = _np.broadcast_to(_np.asarray(scale, dtype=_np.float64), (n_bands,))
+    offset = _np.broadcast_to(_np.asarray(offset, dtype=_np.float64), (n_bands,))
+
+    if reducer is None:
+        projection = _np.eye(n_bands)
+        mean = _np.zeros(n_bands)
+    else:
+        projection = reducer.components_.T.astype(_np.float64)
+        mean = _np.asarray(reducer.mean_, dtype=_np.float64)
+        if getattr(reducer, "whiten", False):
+            projection = projection / _np.sqrt(reducer.explained_variance_)
+        if model.n_features_ is not None:
+            projection = projection[:, 0 : model.n_features_]
+
+    selected = getattr(model, "selected_features_", None)
+    if selected is not None:
+        projection = projection[:, selected]
+
+    weights = scale[:, _np.newaxis] * projection
+    bias = (offset - mean) @ projection
+
+    return [weights.astype(dtype), bias.astype(dtype)]
+
+
+def affine(x, weights, bias, chunk_size=16384, out=None):
+    """Applies an affine map (see transform.linear()) in chunks of rows
+
+    Only one chunk of x is converted to floating point at a time, so x can stay in its
+    stored integer type.
+
+    Args:
+        x          - the input features with shape (n_samples, n_bands), in any numeric type
+        weights    - the weights with shape (n_bands, n_features)
+        bias       - the bias with shape (n_features)
+        chunk_size - the number of rows to convert and transform at a time
+        out        - an optional array with shape (n_samples, n_features) to write into
+
+    Returns:
+        an array of transformed features with shape (n_samples, n_features)
+    """
+    if out is None:
+        out = _np.empty((x.shape[0], weights.shape[1]), dtype=weights.dtype)
+
+    for start in range(0, x.shape[0], chunk_size):
+        stop = start + chunk_size
+        _np.matmul(x[start:stop].astype(weights.dtype), weights, out=out[start:stop])
+        out[start:stop] += bias
+
+    return out
@@ -0,0 +1,44 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# run the tests against the source tree without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(1984)
+
+
+@pytest.fixture
+def crown_data(rng):
+    """A small, separable data set of 60 crowns with 20 pixels each and 3 classes"""
+    crowns = np.repeat(np.arange(60), 20)
+    labels = np.array(["sp-a", "sp-b", "sp-c"])[crowns % 3]
+    features = rng.random((len(crowns), 8))
+    features[:, :3] += (crowns % 3)[:, np.newaxis] * 0.5
+
+    return features, labels, crowns
+
+
+@pytest.fixture
+def fitted_model(crown_data):
+    """A two member tree ensemble fit to crown_data"""
+    from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+    import dichot
+
+    features, labels, crowns = crown_data
+    m = dichot.model(
+        models=[
+            RandomForestClassifier(n_estimators=20, random_state=0),
+            ExtraTreesClassifier(n_estimators=10, random_state=0),
+        ],
+        labels=np.unique(labels),
+    )
+    m.fit(features, labels)
+
+    return m
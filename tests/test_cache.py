@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from dichot import cache
+
+
+def test_key_changes_with_settings(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text("id,b1\n1,0.5\n")
+    bands = np.array([True, False])
+
+    base = cache.key(str(path), bands, None, 10, "PCA")
+    assert base == cache.key(str(path), bands.copy(), None, 10, "PCA")
+    assert base != cache.key(str(path), ~bands, None, 10, "PCA")
+    assert base != cache.key(str(path), bands, None, 5, "PCA")
+    assert base != cache.key(str(path), bands, None, 10, None)
+
+    path.write_text("id,b1\n1,0.6\n")
+    assert base != cache.key(str(path), bands, None, 10, "PCA")
+
+
+def test_hit_equals_miss(tmp_path, rng):
+    store = cache.store(str(tmp_path))
+    features = rng.random((50, 4)).astype(np.float32)
+    ids = np.arange(50)
+
+    assert store.get("key") is None
+    store.put("key", features=features, ids=ids)
+    cached = store.get("key")
+
+    assert np.array_equal(cached["features"], features)
+    assert cached["features"].dtype == features.dtype
+    assert np.array_equal(cached["ids"], ids)
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    store = cache.store(str(tmp_path))
+    for i, key in enumerate(["old", "used", "new"]):
+        store.put(key, x=np.zeros(1000))
+        os.utime(os.path.join(str(tmp_path), key), (i, i))
+    store.get("used")
+
+    store.max_size = store.size() * 2 // 3 + 1
+    store.evict()
+
+    assert [entry[0] for entry in store.entries()] == ["new", "used"]
+
+
+def test_commit_marks_entry_as_recent(tmp_path):
+    store = cache.store(str(tmp_path))
+    staged = store.create("staged", {"x": ((1000,), np.float64)})
+    os.utime(os.path.join(str(tmp_path), "staged.tmp-{}".format(os.getpid())), (0, 0))
+    store.put("other", x=np.zeros(1000))
+    os.utime(os.path.join(str(tmp_path), "other"), (1, 1))
+
+    # the just-committed entry survives, even though it was staged first
+    store.max_size = store.size() // 2 + 1000
+    store.commit("staged", staged)
+
+    assert [entry[0] for entry in store.entries()] == ["staged"]
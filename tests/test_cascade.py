@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import dichot
+
+genus_map = {"sp-a": "genus-1", "sp-b": "genus-2", "sp-c": "genus-2"}
+
+
+@pytest.fixture
+def cascade(crown_data):
+    features, labels, crowns = crown_data
+    species_model = dichot.model(
+        models=[RandomForestClassifier(n_estimators=10, random_state=0)]
+    )
+    m = dichot.cascade(
+        genus_map,
+        genus_model=RandomForestClassifier(n_estimators=10, random_state=0),
+        species_model=species_model,
+        min_proba=0.0,
+    )
+    m.fit(features, labels)
+
+    return m
+
+
+def test_probabilities_are_genus_times_species(cascade, crown_data):
+    features = crown_data[0]
+    prob = cascade.predict_proba(features)
+    genus = cascade.genus_model_.predict_proba(features)
+    species = cascade.submodels_[1].predict_proba(features, average_proba=True)
+
+    assert list(cascade.classes_) == ["sp-a", "sp-b", "sp-c"]
+    assert np.allclose(prob.sum(axis=1), 1)
+
+    # genus-1 has one species, so it needs no species model
+    assert cascade.submodels_[0] is None
+    assert np.allclose(prob[:, 0], genus[:, 0])
+    assert np.allclose(prob[:, 1:], genus[:, [1]] * species)
+    assert cascade.skipped_ == 0
+
+
+def test_unlikely_genera_skip_species_models(cascade, crown_data):
+    features = crown_data[0]
+    cascade.min_proba_ = 0.5
+    prob = cascade.predict_proba(features)
+
+    assert cascade.skipped_ > 0
+    assert np.allclose(prob.sum(axis=1), 1)
+    assert np.mean(cascade.predict(features)[:, 0] == crown_data[1]) > 0.9
+
+
+def test_cross_validation_supports_cascades(cascade, crown_data):
+    features, labels, crowns = crown_data
+    classes, results = dichot.cross_validation.run(
+        cascade, features, labels, crowns, n_splits=3, seed=0
+    )
+
+    for ytrue, ypred, yprob in results:
+        assert np.mean(ytrue == ypred) > 0.8
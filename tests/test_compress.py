@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from sklearn import metrics
+
+import dichot
+from dichot import compress
+
+
+def test_truncate_matches_first_trees(fitted_model, crown_data):
+    forest = fitted_model.models_[0]
+    truncated = compress.truncate(forest, 5)
+
+    expected = np.mean(
+        [tree.predict_proba(crown_data[0]) for tree in forest.estimators_[:5]], axis=0
+    )
+    assert compress.n_trees(truncated) == 5
+    assert compress.n_trees(forest) == 20
+    assert np.allclose(truncated.predict_proba(crown_data[0]), expected)
+
+
+def test_encode_maps_labels_to_columns(fitted_model):
+    y = compress.encode(fitted_model, ["sp-c", "sp-a", "sp-c"])
+    assert list(y) == [2, 0, 2]
+
+
+@pytest.mark.parametrize("labels", [["sp-d"], ["sp-a", "sp-0"], ["a"]])
+def test_encode_rejects_unknown_labels(fitted_model, labels):
+    with pytest.raises(ValueError):
+        compress.encode(fitted_model, labels)
+
+
+def test_cascades_are_rejected(crown_data):
+    cascade = dichot.cascade({"sp-a": "a", "sp-b": "b", "sp-c": "b"})
+    with pytest.raises(ValueError):
+        compress.encode(cascade, crown_data[1])
+    with pytest.raises(ValueError):
+        compress.ensemble(cascade, crown_data[0], crown_data[1])
+
+
+def test_ensemble_stays_within_tolerance(fitted_model, crown_data):
+    features, labels, crowns = crown_data
+    y = compress.encode(fitted_model, labels)
+    fitted_model.member_order_ = np.array([1, 0])
+    compressed, report = compress.ensemble(
+        fitted_model, features, y, speedup=2.0, tolerance=0.05
+    )
+
+    prob = compressed.predict_proba(features, average_proba=True)
+    log_loss = metrics.log_loss(y, prob, labels=np.arange(3))
+    assert np.isclose(log_loss, report["selected"]["log_loss"])
+    assert log_loss <= report["baseline"]["log_loss"] + 0.05
+    assert sum(report["trees_after"]) < sum(report["trees_before"])
+
+    # the early exit order only refers to the kept members
+    assert sorted(compressed.member_order_) == list(range(compressed.n_models_))
+
+    # the original model is unchanged
+    assert [compress.n_trees(m) for m in fitted_model.models_] == [20, 10]
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import dichot
+from dichot import cross_validation
+
+
+@pytest.fixture
+def model():
+    return dichot.model(
+        models=[RandomForestClassifier(n_estimators=10, random_state=0)]
+    )
+
+
+def test_no_crown_spans_two_folds(crown_data):
+    features, labels, crowns = crown_data
+    folds = cross_validation.crown_folds(crowns, labels, n_splits=5, seed=0)
+
+    for crown in np.unique(crowns):
+        assert len(np.unique(folds[crowns == crown])) == 1
+
+    # each class is dealt evenly across the folds
+    for label in np.unique(labels):
+        assert np.ptp(np.bincount(folds[labels == label], minlength=5)) <= 20
+
+
+def test_every_sample_is_tested_once(model, crown_data):
+    features, labels, crowns = crown_data
+    classes, results = cross_validation.run(
+        model, features, labels, crowns, n_splits=4, seed=0
+    )
+
+    ytrue = np.concatenate([result[0] for result in results])
+    assert list(classes) == list(np.unique(labels))
+    assert np.array_equal(np.sort(ytrue), np.sort(np.searchsorted(classes, labels)))
+    for ytrue, ypred, yprob in results:
+        assert np.allclose(yprob.sum(axis=1), 1)
+        assert np.mean(ytrue == ypred) > 0.8
+
+
+def test_parallel_folds_match_serial(model, crown_data):
+    features, labels, crowns = crown_data
+    outputs = [
+        cross_validation.run(
+            model, features, labels, crowns, n_splits=3, n_jobs=n_jobs, seed=0
+        )[1]
+        for n_jobs in [1, 2]
+    ]
+
+    for serial, parallel in zip(*outputs):
+        assert np.array_equal(serial[0], parallel[0])
+        assert np.allclose(serial[2], parallel[2])
+
+
+def test_selection_runs_within_folds(model, crown_data):
+    features, labels, crowns = crown_data
+    classes, results = cross_validation.run(
+        model,
+        features,
+        labels,
+        crowns,
+        n_splits=3,
+        seed=0,
+        selection={
+            "estimator": RandomForestClassifier(n_estimators=10, random_state=0),
+            "tolerance": 0.05,
+            "seed": 0,
+        },
+    )
+
+    assert sum([len(result[0]) for result in results]) == len(labels)
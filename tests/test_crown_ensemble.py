@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from dichot import crown_ensemble
+
+
+@pytest.mark.parametrize("percentiles", [(10, 50, 90), (0, 33, 100)])
+def test_summaries_match_numpy(rng, percentiles):
+    # crowns of different sizes (including a single pixel), in shuffled order
+    crowns = np.repeat(["c3", "c1", "c2", "c4"], [7, 1, 12, 5])
+    crowns = crowns[rng.permutation(len(crowns))]
+    features = rng.normal(size=(len(crowns), 4))
+    features[:, 3] = 2.0
+
+    ids, summary = crown_ensemble.summarize(features, crowns, percentiles=percentiles)
+
+    assert list(ids) == ["c1", "c2", "c3", "c4"]
+    assert summary.shape == (4, 4 * (2 + len(percentiles)))
+    for i, crown in enumerate(ids):
+        x = features[crowns == crown]
+        expected = [x.mean(axis=0), x.std(axis=0)]
+        expected += [np.percentile(x, p, axis=0) for p in percentiles]
+        assert np.allclose(summary[i], np.concatenate(expected))
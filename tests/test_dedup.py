@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+from dichot import pipeline
+
+
+def test_unique_rows_round_trip(rng):
+    x = rng.integers(0, 3, size=(200, 4)).astype(np.int16)
+    index, inverse, keys = pipeline.unique_rows(x)
+
+    assert len(np.unique(x, axis=0)) == len(index) == len(keys)
+    assert np.array_equal(x[index][inverse], x)
+
+
+def test_memo_round_trip_and_eviction(rng):
+    cache = pipeline.memo(max_size=64, n_shards=4)
+    keys = [rng.bytes(8) for i in range(200)]
+    values = rng.random((200, 3)).astype(np.float32)
+
+    cache.put(keys[:10], values[:10])
+    found, cached = cache.get(keys[:20])
+    assert list(found) == [True] * 10 + [False] * 10
+    assert np.array_equal(np.array(cached[:10]), values[:10])
+    assert (cache.hits, cache.misses) == (10, 10)
+
+    # recently used entries survive eviction
+    cache.put(keys[10:], values[10:])
+    assert len(cache) <= 64
+    assert cache.get(keys[-5:])[0].all()
+
+
+def test_memo_is_thread_safe(rng):
+    cache = pipeline.memo(max_size=500, n_shards=8)
+    keys = [rng.bytes(8) for i in range(2000)]
+    values = rng.random((2000, 3)).astype(np.float32)
+
+    def worker():
+        for start in range(0, 2000, 100):
+            found, cached = cache.get(keys[start : start + 100])
+            for key, value, hit in zip(keys[start:], cached, found):
+                if hit:
+                    assert np.array_equal(value, values[keys.index(key)])
+            todo = ~found
+            new = [key for key, miss in zip(keys[start : start + 100], todo) if miss]
+            cache.put(new, values[start : start + 100][todo])
+
+    threads = [threading.Thread(target=worker) for i in range(4)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    assert len(cache) <= 500
+    assert cache.hits + cache.misses == 4 * 2000
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def test_unreachable_margin_matches_predict_proba(fitted_model, crown_data):
+    features = crown_data[0]
+    prob, n_exited = fitted_model.predict_proba_early_exit(features, margin=2.0)
+
+    expected = fitted_model.predict_proba(features, average_proba=True)
+    assert np.allclose(prob, expected)
+    assert list(n_exited) == [0, len(features)]
+
+
+def test_zero_margin_uses_the_first_member(fitted_model, crown_data):
+    features = crown_data[0]
+    fitted_model.member_order_ = np.array([1, 0])
+    prob, n_exited = fitted_model.predict_proba_early_exit(features, margin=0.0)
+
+    assert np.allclose(prob, fitted_model.models_[1].predict_proba(features))
+    assert list(n_exited) == [len(features), 0]
+
+
+def test_exited_samples_keep_their_running_average(fitted_model, crown_data):
+    features = crown_data[0]
+    fitted_model.order_by_cost(features[:100])
+    order = fitted_model.member_order_
+    prob, n_exited = fitted_model.predict_proba_early_exit(features, margin=0.5)
+
+    first = fitted_model.models_[order[0]].predict_proba(features)
+    average = fitted_model.predict_proba(features, average_proba=True)
+    top = np.sort(first, axis=1)
+    exited = (top[:, -1] - top[:, -2]) >= 0.5
+
+    assert sorted(order) == [0, 1]
+    assert n_exited.sum() == len(features)
+    assert n_exited[0] == exited.sum()
+    assert np.allclose(prob[exited], first[exited])
+    assert np.allclose(prob[~exited], average[~exited])
@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pytest
+from sklearn.decomposition import NMF, PCA, IncrementalPCA, TruncatedSVD
+from sklearn.ensemble import RandomForestClassifier
+
+import dichot
+from dichot import feature_selection
+
+selected = np.array([0, 2, 3])
+
+
+def reduced_model(reducer, features):
+    good_bands = np.ones(features.shape[1], dtype=bool)
+    good_bands[1] = False
+    m = dichot.model(models=[None], good_bands=good_bands)
+    m.reducer = reducer.fit(features[:, good_bands])
+    m.n_features_ = 5
+
+    return m
+
+
+@pytest.mark.parametrize(
+    "reducer",
+    [PCA(6, whiten=True), IncrementalPCA(6), TruncatedSVD(6), NMF(6, max_iter=2000)],
+    ids=lambda reducer: type(reducer).__name__,
+)
+def test_selection_matches_original_transform(reducer, crown_data):
+    features = crown_data[0]
+    m = reduced_model(reducer, features)
+    original = copy.deepcopy(m)
+    feature_selection.apply(m, selected)
+
+    expected = original.transform(features)[:, selected]
+    assert np.allclose(m.transform(features), expected)
+
+    # only projections are pruned. other reducers keep the selection instead
+    if isinstance(reducer, NMF):
+        assert np.array_equal(m.selected_features_, selected)
+    else:
+        assert m.selected_features_ is None
+        assert m.reducer.components_.shape[0] == len(selected)
+
+
+def test_selection_narrows_good_bands(crown_data):
+    features = crown_data[0]
+    m = dichot.model(models=[None], good_bands=np.ones(features.shape[1], dtype=bool))
+    original = m.transform(features)
+    feature_selection.apply(m, selected)
+
+    assert m.good_bands_.sum() == len(selected)
+    assert np.array_equal(m.transform(features), original[:, selected])
+
+
+def test_select_keeps_informative_features(crown_data):
+    features, labels, crowns = crown_data
+    chosen, report = feature_selection.select(
+        features,
+        labels,
+        estimator=RandomForestClassifier(n_estimators=10, random_state=0),
+        tolerance=0.02,
+        seed=0,
+    )
+
+    # the smallest subset within the tolerance of using all features is chosen
+    accuracy = dict([(n_features, score) for n_features, score in report])
+    assert len(chosen) < features.shape[1]
+    assert accuracy[len(chosen)] >= accuracy[features.shape[1]] - 0.02
+    assert set(chosen) & {0, 1, 2}
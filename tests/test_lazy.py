@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def loaded_after(statement):
+    code = "import sys; {}; print(' '.join(sorted(sys.modules)))".format(statement)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    return set(output.stdout.split())
+
+
+def test_import_skips_heavy_dependencies():
+    loaded = loaded_after("from dichot import prnt, read; prnt.status; read.bands")
+    for name in ["sklearn", "pandas", "osgeo"]:
+        assert name not in loaded
+
+
+def test_first_use_loads_dependency():
+    loaded = loaded_after("import dichot; dichot.model()")
+    assert "sklearn" in loaded
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+import dichot
+from dichot import pipeline
+
+
+def test_tiles_cover_raster_once():
+    covered = np.zeros((70, 45), dtype=int)
+    for xoff, yoff, xsize, ysize in pipeline.tiles(45, 70, 16, 16):
+        covered[yoff : yoff + ysize, xoff : xoff + xsize] += 1
+
+    assert (covered == 1).all()
+
+
+def write_raster(path, data, no_data=None):
+    gdal = pytest.importorskip("osgeo.gdal")
+    nb, ny, nx = data.shape
+    dt = dichot.read.gdal_dtype(data.dtype)
+    ref = gdal.GetDriverByName("GTiff").Create(str(path), nx, ny, nb, dt)
+    for i in range(nb):
+        band = ref.GetRasterBand(i + 1)
+        band.WriteArray(data[i])
+        if no_data is not None:
+            band.SetNoDataValue(no_data)
+    ref.FlushCache()
+    ref = None
+
+
+def read_raster(path):
+    gdal = pytest.importorskip("osgeo.gdal")
+    ref = gdal.Open(str(path))
+    return ref.ReadAsArray(), ref.GetRasterBand(1).GetNoDataValue()
+
+
+@pytest.fixture
+def image(rng, crown_data):
+    # one valid pixel per training sample, plus a no-data pixel
+    features = crown_data[0][:700]
+    data = features.T.reshape(8, 35, 20).copy()
+    data[:, 3, 4] = -1
+
+    return data
+
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_tiled_output_matches_predict_proba(tmp_path, fitted_model, image, n_workers):
+    write_raster(tmp_path / "in.tif", image, no_data=-1)
+    pipeline.apply_raster(
+        fitted_model,
+        str(tmp_path / "in.tif"),
+        str(tmp_path / "out.tif"),
+        tile_size=16,
+        n_workers=n_workers,
+    )
+    out, no_data = read_raster(tmp_path / "out.tif")
+
+    features = image.reshape(8, -1).T
+    expected = fitted_model.predict_proba(features, average_proba=True)
+    expected = expected.T.reshape(out.shape)
+
+    valid = out[0] != no_data
+    assert (~valid).sum() == 1 and not valid[3, 4]
+    assert np.allclose(out[:, valid], expected[:, valid], atol=1e-6)
+
+
+def test_uncalibrated_model_defaults_to_raw_members(tmp_path, fitted_model, image):
+    write_raster(tmp_path / "in.tif", image, no_data=-1)
+    pipeline.apply_raster(
+        fitted_model, str(tmp_path / "in.tif"), str(tmp_path / "out.tif")
+    )
+    out, no_data = read_raster(tmp_path / "out.tif")
+    assert np.isfinite(out).all()
+
+
+def test_cached_features_give_the_same_output(tmp_path, fitted_model, image):
+    write_raster(tmp_path / "in.tif", image, no_data=-1)
+    store = dichot.cache.store(str(tmp_path / "cache"))
+    outputs = []
+    for name in ["miss.tif", "hit.tif"]:
+        pipeline.apply_raster(
+            fitted_model,
+            str(tmp_path / "in.tif"),
+            str(tmp_path / name),
+            tile_size=16,
+            cache=store,
+            cache_key="scene",
+        )
+        outputs.append(read_raster(tmp_path / name)[0])
+
+    assert store.hits == 1
+    assert np.array_equal(outputs[0], outputs[1])
+
+
+@pytest.mark.parametrize("fused", [False, True])
+def test_scaled_integer_input_matches_float_input(
+    tmp_path, fitted_model, image, fused
+):
+    stored = np.round(image * 1e4).astype(np.int16)
+    write_raster(tmp_path / "in.tif", stored, no_data=-10000)
+    pipeline.apply_raster(
+        fitted_model,
+        str(tmp_path / "in.tif"),
+        str(tmp_path / "out.tif"),
+        tile_size=16,
+        scale=1e-4,
+        fused=fused,
+    )
+    out, no_data = read_raster(tmp_path / "out.tif")
+
+    features = stored.reshape(8, -1).T * 1e-4
+    expected = fitted_model.predict_proba(features, average_proba=True)
+    expected = expected.T.reshape(out.shape)
+
+    valid = out[0] != no_data
+    assert (~valid).sum() == 1
+    assert np.allclose(out[:, valid], expected[:, valid], atol=1e-6)
+
+
+@pytest.mark.parametrize("dedup_cache", [0, 50])
+def test_deduplicated_output_matches(tmp_path, fitted_model, image, dedup_cache):
+    # repeat a few spectra so tiles share pixels
+    image = image.copy()
+    image[:, 10:20] = image[:, :1, :1]
+    write_raster(tmp_path / "in.tif", image, no_data=-1)
+    for name, dedup in [("plain.tif", False), ("dedup.tif", True)]:
+        pipeline.apply_raster(
+            fitted_model,
+            str(tmp_path / "in.tif"),
+            str(tmp_path / name),
+            tile_size=8,
+            n_workers=2,
+            dedup=dedup,
+            dedup_cache=dedup_cache if dedup else 0,
+        )
+
+    plain = read_raster(tmp_path / "plain.tif")[0]
+    assert np.allclose(read_raster(tmp_path / "dedup.tif")[0], plain)
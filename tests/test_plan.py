@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from dichot import plan
+
+
+@pytest.fixture
+def per_pixel():
+    return plan.pixel_bytes(200, 2, 20, 10, 2)
+
+
+def test_plan_fits_the_budget(per_pixel):
+    for max_memory in [5e7, 2e8, 1e9]:
+        selected = plan.choose(5000, 4000, per_pixel, max_memory, cpus=8)
+        assert selected["estimate"] <= max_memory * 0.8
+        assert 1 <= selected["n_workers"] <= 8
+        assert selected["n_buffers"] == 2 * selected["n_workers"]
+
+
+def test_more_memory_never_shrinks_the_plan(per_pixel):
+    small = plan.choose(5000, 4000, per_pixel, 5e7, cpus=8)
+    large = plan.choose(5000, 4000, per_pixel, 1e9, cpus=8)
+    assert large["n_workers"] >= small["n_workers"]
+    assert large["estimate"] >= small["estimate"]
+
+
+def test_workers_are_capped_by_tiles(per_pixel):
+    selected = plan.choose(100, 100, per_pixel, 1e10, cpus=8)
+    assert selected["n_workers"] <= selected["n_tiles"]
+
+
+def test_impossible_budgets_raise(per_pixel):
+    with pytest.raises(ValueError):
+        plan.choose(5000, 4000, per_pixel, 1e3)
+
+
+def test_pixel_bytes_track_the_pipeline_options():
+    base = plan.pixel_bytes(200, 2, 20, 10, 2)
+    assert plan.pixel_bytes(200, 2, 20, 10, 2, fused=True)["compute"] < base["compute"]
+    dedup = plan.pixel_bytes(200, 2, 20, 10, 2, dedup=True)
+    cached = plan.pixel_bytes(200, 2, 20, 10, 2, dedup_cache=1000)
+    assert base["compute"] < dedup["compute"] < cached["compute"]
+    assert base["buffer"] == 400 and base["output"] == 40
+
+
+def test_spectrum_cache_is_budgeted(fitted_model):
+    gdal_array = pytest.importorskip("osgeo.gdal_array")
+
+    class raster:
+        nx, ny, nb = 2000, 2000, 8
+        dt = gdal_array.NumericTypeCodeToGDALTypeCode(np.dtype(np.int16))
+
+    without = plan.apply_raster(fitted_model, raster, 1e9, cpus=2)
+    cached = plan.apply_raster(fitted_model, raster, 1e9, cpus=2, dedup_cache=10**6)
+    expected = plan.memo_bytes(10**6, 8, 2, 3)
+
+    # the cache is counted up front, leaving less room for tiles and workers
+    assert expected <= cached["estimate"] <= 0.8e9
+    assert cached["tile_size"] * cached["n_workers"] < (
+        without["tile_size"] * without["n_workers"]
+    )
@@ -0,0 +1,73 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from dichot import read
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+
+@pytest.fixture
+def path(tmp_path, rng):
+    data = rng.integers(0, 1000, size=(3, 20, 30)).astype(np.int16)
+    ref = gdal.GetDriverByName("GTiff").Create(
+        str(tmp_path / "in.tif"), 30, 20, 3, gdal.GDT_Int16
+    )
+    for i in range(3):
+        ref.GetRasterBand(i + 1).WriteArray(data[i])
+    ref.FlushCache()
+    ref = None
+
+    return str(tmp_path / "in.tif")
+
+
+def test_windows_match_full_read(path):
+    raster = read.raster(path)
+    data = raster.read_all().data
+    window = raster.read_window(5, 2, 10, 8, bands=[3, 1])
+
+    assert window.dtype == np.int16
+    assert np.array_equal(window, data[[2, 0], 2:10, 5:15])
+
+
+def test_handle_is_reused_until_closed(path):
+    raster = read.raster(path)
+    handle = raster._handle()
+    assert raster._handle() is handle
+
+    # switching to update mode reopens the file
+    assert raster._handle(update=True) is not handle
+
+    raster.close()
+    assert raster._refs == {}
+    assert raster._handle() is not None
+
+
+def test_pickled_and_copied_rasters_open_their_own_handles(path, tmp_path):
+    raster = read.raster(path)
+    handle = raster._handle()
+
+    assert pickle.loads(pickle.dumps(raster))._refs == {}
+
+    copied = raster.copy(str(tmp_path / "out.tif"))
+    assert copied._handle() is not handle
+    assert raster._handle() is handle
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires os.fork()")
+def test_forked_children_keep_the_parent_handle(path):
+    raster = read.raster(path)
+    handle = raster._handle()
+
+    pid = os.fork()
+    if pid == 0:
+        child = raster._handle()
+        raster.close()
+        ok = child is not handle and raster._refs[os.getppid()][0] is handle
+        os._exit(0 if ok else 1)
+
+    status = os.waitpid(pid, 0)[1]
+    assert status == 0
+    assert raster._handle() is handle
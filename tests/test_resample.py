@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from dichot import resample
+
+
+def stream(sampler, features, labels, crowns, chunk_size=97):
+    for start in range(0, len(labels), chunk_size):
+        stop = start + chunk_size
+        sampler.add(
+            features[start:stop], labels[start:stop], crown_id=crowns[start:stop]
+        )
+
+    return sampler.sample()
+
+
+@pytest.fixture
+def pool(rng):
+    # an unbalanced pool of 2000, 500 and 30 samples in crowns of 10, streamed in a
+    #  random order. each feature row holds its position in the stream
+    labels = np.repeat(["a", "b", "c"], [2000, 500, 30])
+    crowns = np.arange(len(labels)) // 10
+    order = rng.permutation(len(labels))
+    labels, crowns = labels[order], crowns[order]
+    features = np.arange(len(labels), dtype=float)[:, np.newaxis]
+
+    return features, labels, crowns
+
+
+@pytest.mark.parametrize("replace", [True, False])
+def test_class_counts_respect_the_cap(pool, replace):
+    features, labels, crowns = pool
+    sampler = resample.reservoir(n_per_class=100, replace=replace, seed=0)
+    x, y, sampled_crowns = stream(sampler, features, labels, crowns)
+
+    counts = np.bincount(y)
+    assert list(sampler.labels_) == ["a", "b", "c"]
+    if replace:
+        assert list(counts) == [100, 100, 100]
+    else:
+        assert list(counts) == [100, 100, 30]
+        assert len(np.unique(x)) == len(x)
+
+    # every sample keeps its own label and crown
+    rows = x[:, 0].astype(int)
+    assert np.array_equal(labels[rows], sampler.labels_[y])
+    assert np.array_equal(crowns[rows], sampled_crowns)
+
+
+@pytest.mark.parametrize("replace", [True, False])
+def test_samples_per_crown_respect_the_cap(pool, replace):
+    features, labels, crowns = pool
+    sampler = resample.reservoir(
+        n_per_class=100, replace=replace, max_per_crown=2, seed=0
+    )
+    x, y, sampled_crowns = stream(sampler, features, labels, crowns)
+
+    assert np.bincount(sampled_crowns).max() <= 2
+    assert np.bincount(y).max() <= 100
+
+
+def test_reservoir_samples_uniformly(pool):
+    features, labels, crowns = pool
+    index = np.where(labels == "a")[0]
+    means = []
+    for seed in range(20):
+        sampler = resample.reservoir(n_per_class=100, replace=False, seed=seed)
+        x, y, sampled_crowns = stream(sampler, features, labels, crowns)
+        means.append(np.mean(np.searchsorted(index, x[y == 0, 0])))
+
+    # the mean stream position of the sampled rows is near the middle of the class
+    assert abs(np.mean(means) - len(index) / 2) < 0.05 * len(index)
+
+
+def test_crown_ids_are_required_for_crown_caps(pool):
+    sampler = resample.reservoir(max_per_crown=2)
+    with pytest.raises(ValueError):
+        sampler.add(pool[0], pool[1])
+
+
+@pytest.mark.parametrize("replace", [True, False])
+def test_balance(pool, replace):
+    labels = pool[1]
+    index = resample.balance(labels, n_per_class=50, replace=replace, seed=0)
+
+    counts = np.unique(labels[index], return_counts=True)[1]
+    assert list(counts) == ([50, 50, 50] if replace else [50, 50, 30])
+    if not replace:
+        assert len(np.unique(index)) == len(index)
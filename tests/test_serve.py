@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+import pytest
+
+from dichot import serve
+
+
+@pytest.fixture
+def batcher(fitted_model):
+    return serve.batcher(fitted_model, max_wait=0.05)
+
+
+def test_encode_round_trip(rng):
+    x = rng.random((4, 3))
+    assert np.array_equal(serve.decode(serve.encode(x)), x)
+
+
+def test_batched_predictions_match_direct(fitted_model, batcher, crown_data):
+    features = crown_data[0]
+    chunks = np.array_split(features[:50], 5)
+    results = [None] * len(chunks)
+
+    def submit(i):
+        results[i] = batcher.submit(chunks[i])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(len(chunks))]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    direct = fitted_model.predict_proba(features[:50], average_proba=True)
+    assert np.allclose(np.concatenate(results), direct)
+
+
+@pytest.mark.parametrize(
+    "features",
+    [np.array(1.0), np.zeros((2, 3)), np.zeros((0, 8)), np.array([["x"] * 8])],
+)
+def test_check_rejects_bad_payloads(batcher, features):
+    with pytest.raises(ValueError):
+        batcher.check(features)
+
+
+def test_failing_request_does_not_fail_its_batch(batcher, crown_data):
+    features = crown_data[0]
+    results = {}
+
+    def submit(name, x):
+        try:
+            results[name] = batcher.submit(x).shape
+        except Exception as error:
+            results[name] = type(error)
+
+    requests = [("good", features[:3]), ("bad", features[:2, :5])]
+    threads = [threading.Thread(target=submit, args=request) for request in requests]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+    assert results["good"] == (3, 3)
+    assert results["bad"] is ValueError
+
+    # the batching thread keeps running
+    assert batcher.submit(features[:1]).shape == (1, 3)
+
+
+def test_http_round_trip(fitted_model, batcher, crown_data):
+    httpd = serve.server(batcher, port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = "http://127.0.0.1:{}".format(httpd.server_address[1])
+        prob = serve.predict(crown_data[0][:5], url=url)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    direct = fitted_model.predict_proba(crown_data[0][:5], average_proba=True)
+    assert np.allclose(prob, direct)
+
+
+def test_crown_models_require_summarized_features(fitted_model):
+    fitted_model.crown_percentiles_ = [50]
+    with pytest.raises(ValueError):
+        serve.batcher(fitted_model)
+
+    assert serve.batcher(fitted_model, transform=False).n_features_ == 8
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from sklearn.decomposition import PCA, FactorAnalysis, FastICA, IncrementalPCA
+
+import dichot
+from dichot import transform
+
+
+@pytest.fixture
+def stored(rng):
+    # int16 reflectance, scaled by 1e-4, with one unused band
+    return rng.integers(0, 10000, size=(500, 10)).astype(np.int16)
+
+
+def make_model(reducer, stored, selected=None):
+    good_bands = np.ones(stored.shape[1], dtype=bool)
+    good_bands[4] = False
+    m = dichot.model(models=[None], good_bands=good_bands)
+    if reducer is not None:
+        m.reducer = reducer.fit(stored[:, good_bands] * 1e-4 + 0.01)
+        m.n_features_ = 4
+    m.selected_features_ = selected
+
+    return m
+
+
+@pytest.mark.parametrize(
+    "reducer",
+    [None, PCA(6, whiten=True), PCA(6), IncrementalPCA(6)],
+    ids=lambda reducer: type(reducer).__name__,
+)
+@pytest.mark.parametrize("selected", [None, np.array([0, 3])])
+def test_fused_transform_matches_model_transform(reducer, selected, stored):
+    m = make_model(reducer, stored, selected)
+    weights, bias = transform.linear(m, scale=1e-4, offset=0.01, dtype=np.float64)
+    x = stored[:, m.good_bands_]
+
+    fused = transform.affine(x, weights, bias, chunk_size=64)
+    expected = m.transform(x * 1e-4 + 0.01, subset=False)
+    assert fused.shape == expected.shape
+    assert np.allclose(fused, expected)
+
+
+@pytest.mark.parametrize(
+    "reducer",
+    [FactorAnalysis(4), FastICA(4, random_state=0)],
+    ids=lambda r: type(r).__name__,
+)
+def test_non_pca_reducers_are_not_fused(reducer, stored):
+    assert transform.linear(make_model(reducer, stored)) is None
+
+
+def test_float32_weights_stay_close(stored):
+    m = make_model(PCA(6, whiten=True), stored)
+    weights, bias = transform.linear(m, scale=1e-4, offset=0.01)
+    x = stored[:, m.good_bands_]
+
+    fused = transform.affine(x, weights, bias)
+    assert fused.dtype == np.float32
+    assert np.allclose(fused, m.transform(x * 1e-4 + 0.01, subset=False), atol=1e-4)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+import dichot
+
+
+def test_update_adds_trees_and_keeps_the_old_ones(fitted_model, crown_data):
+    features, labels, crowns = crown_data
+    old_trees = list(fitted_model.models_[0].estimators_)
+    fitted_model.update(features[::2], labels[::2])
+
+    forest, extra = fitted_model.models_
+    assert len(forest.estimators_) == 25 and len(extra.estimators_) == 12
+    assert all([a is b for a, b in zip(old_trees, forest.estimators_)])
+    assert not forest.get_params()["warm_start"]
+    assert not fitted_model.is_calibrated_
+
+    prob = fitted_model.predict_proba(features, average_proba=True)
+    assert np.mean(np.unique(labels)[prob.argmax(axis=1)] == labels) > 0.9
+
+
+def test_update_adds_the_requested_number_of_trees(fitted_model, crown_data):
+    features, labels, crowns = crown_data
+    fitted_model.update(features, labels, n_new=3)
+    assert [len(m.estimators_) for m in fitted_model.models_] == [23, 13]
+
+
+@pytest.mark.parametrize("keep", [["sp-a", "sp-b"], ["sp-a", "sp-b", "sp-c", "sp-d"]])
+def test_update_requires_the_same_classes(fitted_model, crown_data, keep):
+    features, labels, crowns = crown_data
+    labels = labels.copy()
+    if "sp-d" in keep:
+        labels[:5] = "sp-d"
+    index = np.isin(labels, keep)
+
+    with pytest.raises(ValueError):
+        fitted_model.update(features[index], labels[index])
+
+    # nothing is changed when an update is rejected
+    assert [len(m.estimators_) for m in fitted_model.models_] == [20, 10]
+
+
+def test_update_rejects_models_that_are_not_ensembles(crown_data):
+    features, labels, crowns = crown_data
+    m = dichot.model(models=[LogisticRegression()])
+    m.fit(features, labels)
+
+    with pytest.raises(ValueError):
+        m.update(features, labels)
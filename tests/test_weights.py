@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from sklearn.utils.class_weight import compute_sample_weight
+
+import dichot
+
+labels = np.array(["b", "a", "c", "b", "b", "a", "b", "c", "b"])
+
+
+def test_encode_labels():
+    classes, codes, counts = dichot.encode_labels(labels)
+
+    assert list(classes) == ["a", "b", "c"]
+    assert np.array_equal(classes[codes], labels)
+    assert list(counts) == [2, 5, 2]
+
+
+def test_balanced_weights_match_sklearn():
+    weights = dichot.get_sample_weights(labels)
+    assert np.allclose(weights, compute_sample_weight("balanced", labels))
+
+
+def test_inverse_sqrt_weights_average_to_one():
+    weights = dichot.get_sample_weights(labels, method="inverse_sqrt")
+
+    assert np.isclose(weights.mean(), 1)
+    assert np.isclose(weights[1] / weights[0], np.sqrt(5 / 2))
+
+
+def test_dictionary_weights():
+    weights = dichot.get_sample_weights(labels, method={"a": 3.0})
+    assert list(weights) == [1, 3, 1, 1, 1, 3, 1, 1, 1]
+
+
+def test_unknown_method_raises():
+    with pytest.raises(ValueError):
+        dichot.get_sample_weights(labels, method="unknown")